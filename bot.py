@@ -4,8 +4,11 @@ import asyncio
 from aiohttp import web
 from pyrogram import Client, filters
 from pyrogram.types import BotCommand
-from config import API_ID, API_HASH, BOT_TOKEN, DOWNLOAD_DIR
+from config import API_ID, API_HASH, BOT_TOKEN, DOWNLOAD_DIR, MAX_TOTAL_UPLOADS
 from database.database import init_db
+from utils.extraction_engine import init_extraction_engine, shutdown_extraction_engine
+from utils.disk_budget import disk_budget
+from utils.sweeper import start_sweeper
 
 # Health check port for Koyeb
 HEALTH_CHECK_PORT = int(os.environ.get("PORT", 8000))
@@ -27,9 +30,6 @@ async def start_health_server():
     await site.start()
     print(f"Health check server running on port {HEALTH_CHECK_PORT}")
 
-# Create downloads directory
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
 # Cleanup old downloads on startup
 def cleanup_downloads():
     """Clean up downloads folder on bot startup"""
@@ -49,31 +49,40 @@ def cleanup_downloads():
     except Exception as e:
         print(f"Error during cleanup: {e}")
 
-# Initialize Pyrogram Client with optimized settings
-app = Client(
-    "unzip_bot",
-    api_id=API_ID,
-    api_hash=API_HASH,
-    bot_token=BOT_TOKEN,
-    plugins=dict(root="plugins"),
-    sleep_threshold=60,  # Prevent flood wait
-    workers=8  # Increase concurrent workers for better performance
-)
-
-
-@app.on_message(filters.command("start") & filters.private, group=-1)
 async def setup_commands_on_first_start(client, message):
     """Set bot commands on first interaction"""
     # This will only set commands once
     pass
 
 
-async def set_bot_commands():
+def create_app():
+    """
+    Initialize Pyrogram Client with optimized settings
+    
+    Only called when the bot starts: extraction workers import this module
+    too, and must not build a client.
+    """
+    client = Client(
+        "unzip_bot",
+        api_id=API_ID,
+        api_hash=API_HASH,
+        bot_token=BOT_TOKEN,
+        plugins=dict(root="plugins"),
+        sleep_threshold=60,  # Prevent flood wait
+        workers=8,  # Increase concurrent workers for better performance
+        max_concurrent_transmissions=MAX_TOTAL_UPLOADS  # Allow parallel uploads across jobs
+    )
+    client.on_message(filters.command("start") & filters.private, group=-1)(setup_commands_on_first_start)
+    return client
+
+
+async def set_bot_commands(client):
     """Set bot commands menu"""
     commands = [
         BotCommand("start", "Start the bot"),
         BotCommand("help", "Get help and usage info"),
         BotCommand("unzip", "Extract archive file"),
+        BotCommand("list", "Browse archive and pick files"),
         BotCommand("settings", "Configure file upload settings"),
         BotCommand("myplan", "Check your current plan"),
         BotCommand("premium", "Purchase premium subscription"),
@@ -81,7 +90,7 @@ async def set_bot_commands():
         BotCommand("cancel", "Cancel ongoing process")
     ]
     
-    await app.set_bot_commands(commands)
+    await client.set_bot_commands(commands)
 
 
 if __name__ == "__main__":
@@ -89,15 +98,26 @@ if __name__ == "__main__":
     
     # Cleanup old files
     cleanup_downloads()
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     
     # Initialize database
     init_db()
     
+    # Start the shared extraction process pool
+    init_extraction_engine()
+    
+    # Measure the scratch space jobs may use, now that old files are gone
+    disk_budget.refresh()
+    
+    app = create_app()
+    
     # Set commands when bot starts
     async def on_startup():
         # Start health check server for Koyeb
         await start_health_server()
-        await set_bot_commands()
+        await set_bot_commands(app)
+        # Expire premium plans and reset daily quotas in the background
+        start_sweeper()
     
     app.start()
     app.loop.run_until_complete(on_startup())
@@ -109,5 +129,6 @@ if __name__ == "__main__":
     from pyrogram import idle
     idle()
     app.stop()
+    shutdown_extraction_engine()
 
 
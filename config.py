@@ -14,25 +14,79 @@ ADMINS = list(map(int, os.getenv("ADMINS", "").split()))
 # MongoDB Configuration
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "unzip_bot")
+# Connection pool size, also the number of threads running async DB calls
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "20"))
 
 # Download Configuration
 DOWNLOAD_DIR = "downloads"
 MAX_CONCURRENT_DOWNLOADS = 3
 
+# Scratch Disk Configuration
+# Bytes all jobs together may reserve in downloads/ (0 = the free space at startup)
+DISK_BUDGET_BYTES = int(float(os.getenv("DISK_BUDGET_GB", "0")) * 1024 * 1024 * 1024)
+# Free space always left on the volume
+DISK_MIN_FREE_BYTES = int(os.getenv("DISK_MIN_FREE_MB", "1024")) * 1024 * 1024
+# Seconds a job waits for disk space before it is rejected
+DISK_WAIT_TIMEOUT = int(os.getenv("DISK_WAIT_TIMEOUT", "600"))
+
+# Extraction Configuration
+# Worker processes in the shared extraction pool
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+
+# Days an archive's uploaded files are reused for repeat requests
+EXTRACTION_CACHE_TTL_DAYS = int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30"))
+
+# Thumbnail Cache Configuration
+# Normalized custom thumbnails kept on disk, least recently used evicted past the cap
+THUMBNAIL_CACHE_DIR = "thumbnails"
+THUMBNAIL_CACHE_BYTES = int(os.getenv("THUMBNAIL_CACHE_MB", "50")) * 1024 * 1024
+
+# Upload Configuration
+# Files uploaded in parallel per extraction job, and across the whole bot
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "3"))
+MAX_TOTAL_UPLOADS = MAX_CONCURRENT_UPLOADS * MAX_CONCURRENT_DOWNLOADS
+
+# Status Message Configuration
+# Minimum seconds between progress edits in one chat
+STATUS_EDIT_INTERVAL = int(os.getenv("STATUS_EDIT_INTERVAL", "5"))
+
+# Cache Configuration
+# User settings kept in memory, and for how long (seconds)
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "5000"))
+SETTINGS_CACHE_TTL = int(os.getenv("SETTINGS_CACHE_TTL", "600"))
+
+# Redeem Configuration
+# /redeem attempts allowed per user per window (seconds), against code guessing
+REDEEM_MAX_ATTEMPTS = int(os.getenv("REDEEM_MAX_ATTEMPTS", "5"))
+REDEEM_ATTEMPT_WINDOW = int(os.getenv("REDEEM_ATTEMPT_WINDOW", "600"))
+
+# Maintenance Configuration
+# Seconds between background sweeps for expired premium and daily resets
+SWEEP_INTERVAL = int(os.getenv("SWEEP_INTERVAL", "300"))
+
 # User Tier Limits
-# Format: {tier: {"daily_files": count, "max_size_bytes": size}}
+# Format: {tier: {"daily_files": count, "max_size_bytes": size, expansion limits of one archive}}
 USER_LIMITS = {
     "free": {
         "daily_files": 1,
         "max_size_bytes": 1 * 1024 * 1024 * 1024,  # 1 GB
+        "max_unpacked_bytes": 4 * 1024 * 1024 * 1024,  # 4 GB unpacked per archive
+        "max_member_bytes": 1 * 1024 * 1024 * 1024,  # 1 GB per extracted file
+        "max_compression_ratio": 100,  # unpacked/packed, beyond this it's a zip bomb
     },
     "premium": {
         "daily_files": 15,
         "max_size_bytes": 2 * 1024 * 1024 * 1024,  # 2 GB
+        "max_unpacked_bytes": 8 * 1024 * 1024 * 1024,  # 8 GB
+        "max_member_bytes": 2 * 1024 * 1024 * 1024,  # 2 GB
+        "max_compression_ratio": 200,
     },
     "ultra_premium": {
         "daily_files": 50,
         "max_size_bytes": 2 * 1024 * 1024 * 1024,  # 2 GB
+        "max_unpacked_bytes": 16 * 1024 * 1024 * 1024,  # 16 GB
+        "max_member_bytes": 2 * 1024 * 1024 * 1024,  # 2 GB
+        "max_compression_ratio": 200,
     }
 }
 
@@ -51,8 +105,18 @@ PREMIUM_PLANS = {
     }
 }
 
+# Broadcast Configuration
+# Messages in flight at once, and users read from the database per page
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+
 # Force Subscription
 MAX_FORCE_SUB_CHANNELS = 4
+# Seconds a membership check result is reused; "not joined" is rechecked sooner
+FORCE_SUB_MEMBER_TTL = int(os.getenv("FORCE_SUB_MEMBER_TTL", "600"))
+FORCE_SUB_NOT_MEMBER_TTL = int(os.getenv("FORCE_SUB_NOT_MEMBER_TTL", "30"))
+# Seconds the channel list and private channel invite links are reused
+FORCE_SUB_CHANNELS_TTL = int(os.getenv("FORCE_SUB_CHANNELS_TTL", "300"))
 
 # File Types
 SUPPORTED_EXTENSIONS = ['.zip', '.rar', '.7z', '.tar', '.gz', '.bz2']
@@ -91,6 +155,7 @@ HELP_MESSAGE = """
 2️⃣ **Extract the File:**
    • Reply to the file with `/unzip`
    • For password-protected files: `/unzip "your_password"`
+   • Only need a few files? Reply with `/list` and pick them
 
 3️⃣ **Receive Files:**
    • Bot will extract and send all files to you
@@ -100,6 +165,7 @@ HELP_MESSAGE = """
 /start - Start the bot
 /help - Show this help message
 /unzip - Extract file (reply to file message)
+/list - Browse an archive and pick files to extract
 /myplan - Check current plan and usage
 /premium - View premium plans
 /redeem - Redeem premium code
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import MONGO_POOL_SIZE
+from database import database
+
+
+# Dedicated threads for blocking pymongo calls, one per pooled connection
+db_executor = ThreadPoolExecutor(max_workers=MONGO_POOL_SIZE, thread_name_prefix="mongo")
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Run a blocking database call without blocking the event loop"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+
+class AsyncCollection:
+    """Awaitable wrapper around a pymongo collection"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    async def find_one(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.find_one, *args, **kwargs)
+    
+    async def find(self, filter=None, projection=None, sort=None, limit=0):
+        """Run a query and return all matching documents as a list"""
+        def _find():
+            cursor = self.collection.find(filter or {}, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+        
+        return await run_in_db_executor(_find)
+    
+    async def insert_one(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.insert_one, *args, **kwargs)
+    
+    async def insert_many(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.insert_many, *args, **kwargs)
+    
+    async def update_one(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.update_one, *args, **kwargs)
+    
+    async def update_many(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.update_many, *args, **kwargs)
+    
+    async def find_one_and_update(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.find_one_and_update, *args, **kwargs)
+    
+    async def delete_one(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.delete_one, *args, **kwargs)
+    
+    async def count_documents(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.count_documents, *args, **kwargs)
+    
+    async def bulk_write(self, *args, **kwargs):
+        return await run_in_db_executor(self.collection.bulk_write, *args, **kwargs)
+    
+    async def aggregate(self, pipeline, **kwargs):
+        """Run an aggregation and return all result documents as a list"""
+        return await run_in_db_executor(lambda: list(self.collection.aggregate(pipeline, **kwargs)))
+
+
+# Async collections
+users = AsyncCollection(database.users_collection)
+downloads = AsyncCollection(database.downloads_collection)
+force_sub_channels = AsyncCollection(database.force_sub_channels_collection)
+bot_config = AsyncCollection(database.bot_config_collection)
+redeem_codes = AsyncCollection(database.redeem_codes_collection)
+user_settings = AsyncCollection(database.user_settings_collection)
+extraction_cache = AsyncCollection(database.extraction_cache_collection)
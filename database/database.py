@@ -1,8 +1,30 @@
 from pymongo import MongoClient
-from config import MONGODB_URI, DATABASE_NAME
+from config import MONGODB_URI, DATABASE_NAME, MONGO_POOL_SIZE, EXTRACTION_CACHE_TTL_DAYS
+
+
+def create_client(uri):
+    """
+    Create the MongoDB client
+    
+    A `mongomock://` URI selects an in-memory stand-in (requires the
+    mongomock package) so the bot can be run and tested offline.
+    """
+    if uri.startswith("mongomock://"):
+        try:
+            import mongomock
+        except ImportError:
+            raise RuntimeError("MONGODB_URI=mongomock:// requires the mongomock package (pip install mongomock)")
+        return mongomock.MongoClient()
+    
+    # Pooled connections are shared by the async data layer's executor threads.
+    # Nothing connects (or starts monitor threads) before the first query,
+    # so processes that only import this module, like extraction workers,
+    # stay free of pymongo threads.
+    return MongoClient(uri, maxPoolSize=MONGO_POOL_SIZE, connect=False)
+
 
 # MongoDB Client
-client = MongoClient(MONGODB_URI)
+client = create_client(MONGODB_URI)
 db = client[DATABASE_NAME]
 
 # Collections
@@ -14,21 +36,59 @@ bot_config_collection = db['bot_config']
 redeem_codes_collection = db['redeem_codes']
 ongoing_processes_collection = db['ongoing_processes']
 user_settings_collection = db['user_settings']
+extraction_cache_collection = db['extraction_cache']
+
+# bot_config document with running totals for /stats
+COUNTERS_SETTING = "counters"
 
 
 def init_db():
     """Initialize the database by creating indexes"""
     # Create indexes for better performance
     users_collection.create_index("id", unique=True)
+    # Background expiry and daily-reset sweeps
+    users_collection.create_index("premium_expiry")
+    users_collection.create_index("last_reset")
     force_sub_channels_collection.create_index("channel_id", unique=True)
     bot_config_collection.create_index("setting_name", unique=True)
     redeem_codes_collection.create_index("code", unique=True)
+    # Covers the claim filter {"code", "is_used": False}
+    redeem_codes_collection.create_index([("code", 1), ("is_used", 1)])
     ongoing_processes_collection.create_index("user_id")
     user_settings_collection.create_index("user_id", unique=True)
+    extraction_cache_collection.create_index("key", unique=True)
+    extraction_cache_collection.create_index("created_at", expireAfterSeconds=EXTRACTION_CACHE_TTL_DAYS * 24 * 3600)
+    
+    seed_counters()
     
     print("MongoDB initialized successfully!")
 
 
+def seed_counters():
+    """
+    Create the running totals document from existing data, once
+    
+    Afterwards the totals are only incremented (see repository.increment_counters),
+    so /stats never has to scan the downloads history.
+    """
+    if bot_config_collection.find_one({"setting_name": COUNTERS_SETTING}):
+        return
+    
+    result = list(downloads_collection.aggregate([
+        {"$group": {"_id": None, "count": {"$sum": 1}, "bytes": {"$sum": "$size"}}}
+    ]))
+    bot_config_collection.update_one(
+        {"setting_name": COUNTERS_SETTING},
+        {"$setOnInsert": {
+            "extractions": result[0]['count'] if result else 0,
+            "bytes_processed": result[0]['bytes'] if result else 0,
+            "codes_total": redeem_codes_collection.count_documents({}),
+            "codes_used": redeem_codes_collection.count_documents({"is_used": True})
+        }},
+        upsert=True
+    )
+
+
 def get_db():
     """Get database instance"""
     return db
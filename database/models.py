@@ -72,6 +72,7 @@ UserSettings Collection:
     "custom_caption": str or None,  # Caption template with variables
     "caption_entities": list or None,  # Telegram MessageEntity objects for formatting
     "thumbnail": str or None,  # file_id of thumbnail image
+    "thumbnail_unique_id": str or None,  # file_unique_id of the thumbnail, keys the local cache
     "caption_replacements": str,  # Pipe-separated: "old:new | word"
     "filename_replacements": str,  # Pipe-separated: "old:new | word"
     "filename_prefix": str or None,  # Prefix (space added automatically)
@@ -0,0 +1,158 @@
+from datetime import datetime
+from database.async_database import users, user_settings, bot_config, force_sub_channels, redeem_codes
+from database.database import COUNTERS_SETTING
+
+
+# Users
+
+async def get_user(user_id):
+    """Get a user document by Telegram user ID"""
+    return await users.find_one({"id": user_id})
+
+
+async def register_user(user_id, username, first_name):
+    """
+    Create the user on first /start, otherwise refresh their profile
+    and clear the banned flag, in a single upsert
+    """
+    now = datetime.utcnow()
+    await users.update_one(
+        {"id": user_id},
+        {
+            "$set": {"username": username, "first_name": first_name, "is_banned": False},
+            "$setOnInsert": {
+                "join_date": now,
+                "tier": "free",
+                "daily_count": 0,
+                "last_reset": now
+            }
+        },
+        upsert=True
+    )
+
+
+async def update_user(user_id, updates):
+    """Set fields on a user document"""
+    await users.update_one({"id": user_id}, {"$set": updates})
+
+
+# User settings
+
+async def find_user_settings(user_id):
+    """Get the stored settings document of a user, or None"""
+    return await user_settings.find_one({"user_id": user_id}, {"_id": 0})
+
+
+async def save_user_settings(user_id, updates):
+    """Upsert settings fields for a user"""
+    await user_settings.update_one(
+        {"user_id": user_id},
+        {"$set": updates},
+        upsert=True
+    )
+
+
+# Bot config
+
+async def get_config(setting_name):
+    """Get a bot config document by setting name, or None"""
+    return await bot_config.find_one({"setting_name": setting_name})
+
+
+async def set_config(setting_name, values):
+    """Upsert fields on a bot config document"""
+    await bot_config.update_one(
+        {"setting_name": setting_name},
+        {"$set": values},
+        upsert=True
+    )
+
+
+# Stats
+
+async def increment_counters(amounts):
+    """Add to the running totals, e.g. {"extractions": 1, "bytes_processed": size}"""
+    await bot_config.update_one(
+        {"setting_name": COUNTERS_SETTING},
+        {"$inc": amounts},
+        upsert=True
+    )
+
+
+async def get_counters():
+    """Get the running totals document"""
+    return await get_config(COUNTERS_SETTING) or {}
+
+
+async def get_user_breakdown():
+    """
+    Count users in a single aggregation
+    
+    Returns: dict with total, active and a per-tier count dict
+    """
+    result = await users.aggregate([
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "active": [{"$match": {"is_banned": {"$ne": True}}}, {"$count": "count"}],
+            "tiers": [{"$group": {"_id": {"$ifNull": ["$tier", "free"]}, "count": {"$sum": 1}}}]
+        }}
+    ])
+    facets = result[0] if result else {}
+    
+    return {
+        'total': facets['total'][0]['count'] if facets.get('total') else 0,
+        'active': facets['active'][0]['count'] if facets.get('active') else 0,
+        'tiers': {tier['_id']: tier['count'] for tier in facets.get('tiers', [])}
+    }
+
+
+# Redeem codes
+
+async def claim_redeem_code(code, user_id):
+    """
+    Mark an unused code as used by a user, atomically
+    
+    Only one of several concurrent claims of the same code can match.
+    Returns: the code document, or None if it doesn't exist or was used
+    """
+    return await redeem_codes.find_one_and_update(
+        {"code": code, "is_used": False},
+        {"$set": {"is_used": True, "used_by": user_id, "used_date": datetime.utcnow()}}
+    )
+
+
+async def redeem_code_exists(code):
+    """Whether a code exists at all, used or not"""
+    return await redeem_codes.find_one({"code": code}, {"_id": 1}) is not None
+
+
+async def list_redeem_codes(limit=0):
+    """Get redeem codes, used or not"""
+    return await redeem_codes.find(limit=limit)
+
+
+# Force subscription channels
+
+async def list_force_sub_channels(limit=0):
+    """Get configured force subscription channels"""
+    return await force_sub_channels.find(limit=limit)
+
+
+async def get_force_sub_channel(channel_id):
+    """Get a force subscription channel by chat ID, or None"""
+    return await force_sub_channels.find_one({"channel_id": channel_id})
+
+
+async def count_force_sub_channels():
+    """Number of configured force subscription channels"""
+    return await force_sub_channels.count_documents({})
+
+
+async def add_force_sub_channel(channel_data):
+    """Add a force subscription channel document"""
+    await force_sub_channels.insert_one(channel_data)
+
+
+async def remove_force_sub_channel(channel_id):
+    """Remove a force subscription channel by chat ID"""
+    await force_sub_channels.delete_one({"channel_id": channel_id})
@@ -1,4 +1,23 @@
-from database.database import user_settings_collection
+import copy
+import itertools
+from database.repository import find_user_settings, save_user_settings
+from utils.cache import TTLCache, MISSING
+from config import SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL
+
+
+# Settings rarely change, so most reads are served from memory. Writes go
+# through update_user_settings/reset_user_settings which keep it in sync.
+settings_cache = TTLCache(SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
+
+# Generation of each user's settings, changed by every write. A read that
+# overlapped a write only caches its result if the generation is unchanged,
+# otherwise it could cache the document as it was before the write.
+settings_generations = TTLCache(SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
+_next_generation = itertools.count(1)
+
+
+def _bump_generation(user_id):
+    settings_generations.set(user_id, next(_next_generation))
 
 
 def get_default_settings():
@@ -8,6 +27,7 @@ def get_default_settings():
         "custom_caption": None,
         "caption_entities": None,
         "thumbnail": None,
+        "thumbnail_unique_id": None,
         "caption_replacements": "",
         "filename_replacements": "",
         "filename_prefix": None,
@@ -15,7 +35,7 @@ def get_default_settings():
     }
 
 
-def get_user_settings(user_id):
+async def get_user_settings(user_id):
     """
     Get user settings from database or return defaults
     
@@ -25,25 +45,30 @@ def get_user_settings(user_id):
     Returns:
         dict: User settings
     """
-    settings = user_settings_collection.find_one({"user_id": user_id})
-    
-    if not settings:
-        # Return default settings if user hasn't configured anything yet
-        return get_default_settings()
-    
-    # Remove MongoDB _id field
-    settings.pop('_id', None)
+    settings = settings_cache.get(user_id)
     
-    # Ensure all fields exist (for backward compatibility)
-    defaults = get_default_settings()
-    for key, value in defaults.items():
-        if key not in settings:
-            settings[key] = value
+    if settings is MISSING:
+        generation = settings_generations.peek(user_id)
+        settings = await find_user_settings(user_id)
+        
+        if not settings:
+            # Use default settings if user hasn't configured anything yet
+            settings = get_default_settings()
+        else:
+            # Ensure all fields exist (for backward compatibility)
+            defaults = get_default_settings()
+            for key, value in defaults.items():
+                if key not in settings:
+                    settings[key] = value
+        
+        if settings_generations.peek(user_id) == generation:
+            settings_cache.set(user_id, settings)
     
-    return settings
+    # Callers may modify their copy
+    return copy.deepcopy(settings)
 
 
-def update_user_settings(user_id, updates):
+async def update_user_settings(user_id, updates):
     """
     Update specific user settings fields
     
@@ -54,19 +79,23 @@ def update_user_settings(user_id, updates):
     Returns:
         bool: True if successful
     """
+    _bump_generation(user_id)
     try:
-        user_settings_collection.update_one(
-            {"user_id": user_id},
-            {"$set": updates},
-            upsert=True
-        )
-        return True
+        await save_user_settings(user_id, updates)
     except Exception as e:
         print(f"Error updating user settings: {e}")
+        # The write may or may not have landed, re-read next time
+        settings_cache.invalidate(user_id)
         return False
+    
+    # Write through to the cached copy
+    cached = settings_cache.peek(user_id)
+    if cached is not MISSING:
+        cached.update(copy.deepcopy(updates))
+    return True
 
 
-def reset_user_settings(user_id):
+async def reset_user_settings(user_id):
     """
     Reset user settings to defaults
     
@@ -80,12 +109,17 @@ def reset_user_settings(user_id):
         defaults = get_default_settings()
         defaults["user_id"] = user_id
         
-        user_settings_collection.update_one(
-            {"user_id": user_id},
-            {"$set": defaults},
-            upsert=True
-        )
-        return True
+        _bump_generation(user_id)
+        await save_user_settings(user_id, defaults)
     except Exception as e:
         print(f"Error resetting user settings: {e}")
+        settings_cache.invalidate(user_id)
         return False
+    
+    settings_cache.set(user_id, defaults)
+    return True
+
+
+def get_settings_cache_stats():
+    """Hit/miss counters of the settings cache"""
+    return settings_cache.stats()
@@ -1,16 +1,22 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from database.database import (users_collection, downloads_collection, force_sub_channels_collection, 
-                                bot_config_collection, redeem_codes_collection)
-from config import ADMINS, MAX_FORCE_SUB_CHANNELS
+from config import ADMINS, MAX_FORCE_SUB_CHANNELS, DOWNLOAD_DIR
 from datetime import datetime, timedelta
 from utils.helpers import format_size, format_date
 from plugins.cancel import get_active_processes
-import random
-import string
-import csv
+from plugins.force_sub import invalidate_force_sub_cache
+from utils.broadcast import Broadcast, get_checkpoint as get_broadcast_checkpoint
+from utils.user_export import EXPORT_COLUMNS, parse_export_args, write_users_csv
+from database.async_database import run_in_db_executor, users
+from database.repository import (increment_counters, get_counters, get_user_breakdown, get_user, update_user,
+                                 set_config, list_redeem_codes, get_force_sub_channel, count_force_sub_channels,
+                                 add_force_sub_channel, remove_force_sub_channel, list_force_sub_channels)
+from utils.job_scheduler import job_scheduler
+from utils.disk_budget import disk_budget
+from database.user_settings_helper import get_settings_cache_stats
+from utils.redeem_codes import create_codes, MAX_CODES_PER_BATCH
 import io
-import asyncio
+import os
 
 
 def is_admin(user_id):
@@ -18,14 +24,15 @@ def is_admin(user_id):
     return user_id in ADMINS
 
 
-def generate_code():
-    """Generate a 6-digit alphanumeric code"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-
-
 # Store user states for multi-step commands
 admin_states = {}
 
+# Telegram's limit on message text
+MAX_MESSAGE_LENGTH = 4096
+
+# Only one broadcast runs at a time
+broadcast_state = {'running': False}
+
 
 @Client.on_message(filters.command("admin") & filters.private)
 async def admin_panel(client: Client, message: Message):
@@ -38,7 +45,7 @@ async def admin_panel(client: Client, message: Message):
     text += "• /addpremium - Grant premium to user\n"
     text += "• /removepremium - Remove premium\n"
     text += "• /premiumusers - List all premium users\n"
-    text += "• /exportusers - Export user data as CSV\n\n"
+    text += "• /exportusers - Export user data as CSV (columns=, since=, until=, gzip)\n\n"
     
     text += "**Redeem Codes:**\n"
     text += "• /generate - Generate redeem codes\n"
@@ -53,10 +60,12 @@ async def admin_panel(client: Client, message: Message):
     text += "• /setlogchannel - Set log channel\n"
     text += "• /setupi - Configure UPI payment\n"
     text += "• /stats - View bot statistics\n"
-    text += "• /processes - View ongoing processes\n\n"
+    text += "• /processes - View ongoing processes\n"
+    text += "• /diskusage - View scratch disk usage\n\n"
     
     text += "**Broadcasting:**\n"
-    text += "• /broadcast - Broadcast message (reply to message)\n\n"
+    text += "• /broadcast - Broadcast message (reply to message)\n"
+    text += "• /resumebroadcast - Resume an interrupted broadcast\n\n"
     
     await message.reply_text(text)
 
@@ -127,7 +136,7 @@ async def generate_codes_callback(client: Client, callback_query: CallbackQuery)
         await callback_query.message.edit_text(
             f"**Plan:** {admin_states[user_id]['plan_type'].replace('_', ' ').title()}\n"
             f"**Duration:** {duration} day(s)\n\n"
-            "Please type the number of codes to generate (1-50):"
+            f"Please type the number of codes to generate (1-{MAX_CODES_PER_BATCH}):"
         )
         
         # Set state to wait for count
@@ -135,7 +144,7 @@ async def generate_codes_callback(client: Client, callback_query: CallbackQuery)
         return
 
 
-@Client.on_message(filters.text & filters.private & ~filters.command(["start", "help", "unzip", "myplan", "premium", "redeem", "cancel", "admin", "generate", "listcodes", "broadcast", "exportusers", "processes", "addpremium", "removepremium", "addforcesub", "removeforcesub", "listforcesub", "setlogchannel", "stats", "premiumusers", "setupi", "settings"]))
+@Client.on_message(filters.text & filters.private & ~filters.command(["start", "help", "unzip", "list", "myplan", "premium", "redeem", "cancel", "admin", "generate", "listcodes", "broadcast", "resumebroadcast", "exportusers", "processes", "diskusage", "addpremium", "removepremium", "addforcesub", "removeforcesub", "listforcesub", "setlogchannel", "stats", "premiumusers", "setupi", "settings"]))
 async def handle_code_count(client: Client, message: Message):
     """Handle code count input"""
     user_id = message.from_user.id
@@ -150,8 +159,8 @@ async def handle_code_count(client: Client, message: Message):
     try:
         count = int(message.text)
         
-        if count < 1 or count > 50:
-            await message.reply_text("❌ Please enter a number between 1 and 50.")
+        if count < 1 or count > MAX_CODES_PER_BATCH:
+            await message.reply_text(f"❌ Please enter a number between 1 and {MAX_CODES_PER_BATCH}.")
             return
         
         # Generate codes
@@ -160,35 +169,28 @@ async def handle_code_count(client: Client, message: Message):
         
         status_msg = await message.reply_text(f"⏳ Generating {count} code(s)...")
         
-        generated_codes = []
-        for _ in range(count):
-            code = generate_code()
-            # Ensure unique code
-            while redeem_codes_collection.find_one({"code": code}):
-                code = generate_code()
-            
-            redeem_codes_collection.insert_one({
-                "code": code,
-                "plan_type": plan_type,
-                "duration_days": duration,
-                "is_used": False,
-                "used_by": None,
-                "created_date": datetime.utcnow(),
-                "used_date": None
-            })
-            
-            generated_codes.append(code)
-        
-        # Format codes
-        codes_text = "\n".join([f"`{code}`" for code in generated_codes])
+        generated_codes = await create_codes(plan_type, duration, count)
+        await increment_counters({"codes_total": len(generated_codes)})
         
-        await status_msg.edit_text(
-            f"✅ **{count} Code(s) Generated!**\n\n"
+        header = (
+            f"✅ **{len(generated_codes)} Code(s) Generated!**\n\n"
             f"**Plan:** {plan_type.replace('_', ' ').title()}\n"
             f"**Duration:** {duration} day(s)\n\n"
-            f"**Codes:**\n{codes_text}\n\n"
-            f"Users can redeem with: `/redeem CODE`"
         )
+        footer = "Users can redeem with: `/redeem CODE`"
+        
+        # Format codes
+        codes_text = "\n".join([f"`{code}`" for code in generated_codes])
+        text = f"{header}**Codes:**\n{codes_text}\n\n{footer}"
+        
+        if len(text) <= MAX_MESSAGE_LENGTH:
+            await status_msg.edit_text(text)
+        else:
+            # Too long for one message, send the codes as a text file
+            codes_file = io.BytesIO("\n".join(generated_codes).encode('utf-8'))
+            codes_file.name = f"codes_{plan_type}_{duration}d_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
+            await message.reply_document(document=codes_file, caption=f"{header}{footer}")
+            await status_msg.delete()
         
         # Clear state
         admin_states.pop(user_id, None)
@@ -204,7 +206,7 @@ async def list_codes_command(client: Client, message: Message):
         await message.reply_text("❌ This command is for admins only!")
         return
     
-    codes = list(redeem_codes_collection.find().limit(50))
+    codes = await list_redeem_codes(limit=50)
     
     if not codes:
         await message.reply_text("📋 No redeem codes generated yet.")
@@ -239,59 +241,83 @@ async def broadcast_command(client: Client, message: Message):
         )
         return
     
-    users = list(users_collection.find({"is_banned": {"$ne": True}}))
-    total_users = len(users)
+    if broadcast_state.get('running'):
+        await message.reply_text("⚠️ A broadcast is already running!")
+        return
     
-    status_msg = await message.reply_text(
-        f"📤 **Broadcasting...**\n\n"
-        f"Total users: {total_users}\n"
-        f"Progress: 0/{total_users}\n"
-        f"Success: 0\n"
-        f"Failed: 0\n"
-        f"Banned: 0"
-    )
+    await run_broadcast(message, Broadcast(message.reply_to_message))
+
+
+@Client.on_message(filters.command("resumebroadcast") & filters.private)
+async def resume_broadcast_command(client: Client, message: Message):
+    """Resume a broadcast interrupted by a restart"""
+    if not is_admin(message.from_user.id):
+        await message.reply_text("❌ This command is for admins only!")
+        return
+    
+    if broadcast_state.get('running'):
+        await message.reply_text("⚠️ A broadcast is already running!")
+        return
+    
+    checkpoint = await get_broadcast_checkpoint()
+    if not checkpoint or checkpoint.get('status') != "running":
+        await message.reply_text("📭 No interrupted broadcast to resume.")
+        return
     
-    success = 0
-    failed = 0
-    banned = 0
+    try:
+        source_message = await client.get_messages(checkpoint['source_chat_id'], checkpoint['source_message_id'])
+    except Exception as e:
+        await message.reply_text(f"❌ Could not load the broadcast message: {str(e)}")
+        return
     
-    for idx, user in enumerate(users, 1):
+    if not source_message or source_message.empty:
+        await message.reply_text("❌ The broadcast message no longer exists!")
+        return
+    
+    await run_broadcast(message, Broadcast(source_message, checkpoint))
+
+
+def broadcast_status_text(title, stats):
+    """Progress text for broadcast status messages"""
+    return (
+        f"{title}\n\n"
+        f"Total users: {stats['total']}\n"
+        f"Progress: {stats['done']}/{stats['total']}\n"
+        f"Success: {stats['success']}\n"
+        f"Failed: {stats['failed']}\n"
+        f"Banned: {stats['banned']}"
+    )
+
+
+async def run_broadcast(message: Message, broadcast: Broadcast):
+    """Run a broadcast, reporting progress in a status message"""
+    broadcast_state['running'] = True
+    try:
+        status_msg = await message.reply_text(
+            broadcast_status_text("📤 **Broadcasting...**", broadcast.stats())
+        )
+        
+        async def show_progress(stats):
+            await status_msg.edit_text(broadcast_status_text("📤 **Broadcasting...**", stats))
+        
         try:
-            await message.reply_to_message.copy(user['id'])
-            success += 1
-            await asyncio.sleep(0.05)  # Small delay to avoid flooding
+            stats = await broadcast.run(on_progress=show_progress)
         except Exception as e:
-            error_msg = str(e).lower()
-            if 'blocked' in error_msg or 'user is deactivated' in error_msg or 'forbidden' in error_msg:
-                # Mark user as banned
-                users_collection.update_one(
-                    {"id": user['id']},
-                    {"$set": {"is_banned": True}}
-                )
-                banned += 1
-            else:
-                failed += 1
-        
-        # Update status every 10 users
-        if idx % 10 == 0 or idx == total_users:
-            try:
-                await status_msg.edit_text(
-                    f"📤 **Broadcasting...**\n\n"
-                    f"Total users: {total_users}\n"
-                    f"Progress: {idx}/{total_users}\n"
-                    f"Success: {success}\n"
-                    f"Failed: {failed}\n"
-                    f"Banned: {banned}"
-                )
-            except:
-                pass
+            await status_msg.edit_text(
+                f"❌ **Broadcast Interrupted!**\n\n"
+                f"Error: {str(e)}\n\n"
+                f"Use /resumebroadcast to continue from the last checkpoint."
+            )
+            return
+    finally:
+        broadcast_state['running'] = False
     
     await status_msg.edit_text(
         f"✅ **Broadcast Complete!**\n\n"
-        f"**Total Users:** {total_users}\n"
-        f"**Success:** {success}\n"
-        f"**Failed:** {failed}\n"
-        f"**Banned/Blocked:** {banned}\n\n"
+        f"**Total Users:** {stats['total']}\n"
+        f"**Success:** {stats['success']}\n"
+        f"**Failed:** {stats['failed']}\n"
+        f"**Banned/Blocked:** {stats['banned']}\n\n"
         f"Banned users have been marked and won't receive future broadcasts."
     )
 
@@ -303,40 +329,39 @@ async def export_users_command(client: Client, message: Message):
         await message.reply_text("❌ This command is for admins only!")
         return
     
-    status_msg = await message.reply_text("⏳ Generating CSV file...")
+    try:
+        columns, since, until, compress = parse_export_args(message.text.split()[1:])
+    except ValueError as e:
+        await message.reply_text(
+            f"❌ {str(e)}\n\n"
+            f"**Format:** `/exportusers [columns=id,username,...] [since=YYYY-MM-DD] [until=YYYY-MM-DD] [gzip]`\n\n"
+            f"**Columns:** {', '.join(EXPORT_COLUMNS)}"
+        )
+        return
     
-    users = list(users_collection.find())
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['User ID', 'Username', 'First Name', 'Join Date', 'Tier', 'Premium Expiry', 'Daily Count', 'Is Banned'])
-    
-    # Write user data
-    for user in users:
-        writer.writerow([
-            user.get('id', ''),
-            user.get('username', ''),
-            user.get('first_name', ''),
-            user.get('join_date', '').strftime('%Y-%m-%d %H:%M:%S') if user.get('join_date') else '',
-            user.get('tier', 'free'),
-            user.get('premium_expiry', '').strftime('%Y-%m-%d %H:%M:%S') if user.get('premium_expiry') else '',
-            user.get('daily_count', 0),
-            user.get('is_banned', False)
-        ])
+    status_msg = await message.reply_text("⏳ Generating CSV file...")
     
-    # Convert to bytes
-    output.seek(0)
-    csv_bytes = output.getvalue().encode('utf-8')
+    file_name = f"users_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if compress:
+        file_name += ".gz"
+    export_path = os.path.join(DOWNLOAD_DIR, file_name)
     
-    # Send file
-    await message.reply_document(
-        document=io.BytesIO(csv_bytes),
-        file_name=f"users_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        caption=f"📊 **User Data Export**\n\nTotal Users: {len(users)}"
-    )
+    try:
+        # Written on disk in the database executor, never held in memory
+        total_users = await run_in_db_executor(write_users_csv, export_path, columns, since, until, compress)
+        
+        # Send file
+        await message.reply_document(
+            document=export_path,
+            file_name=file_name,
+            caption=f"📊 **User Data Export**\n\nTotal Users: {total_users}"
+        )
+    except Exception as e:
+        await status_msg.edit_text(f"❌ Export failed: {str(e)}")
+        return
+    finally:
+        if os.path.exists(export_path):
+            os.remove(export_path)
     
     await status_msg.delete()
 
@@ -349,12 +374,15 @@ async def processes_command(client: Client, message: Message):
         return
     
     processes = get_active_processes()
+    queued_users = job_scheduler.queued_users()
     
     if not processes:
         await message.reply_text("📊 No ongoing processes.")
         return
     
-    text = f"📊 **Ongoing Processes** ({len(processes)})\n\n"
+    text = f"📊 **Ongoing Processes** ({len(processes)})\n"
+    text += f"⚙️ **Running Jobs:** {job_scheduler.active}/{job_scheduler.max_concurrent}\n"
+    text += f"⏳ **Queued Jobs:** {len(queued_users)}\n\n"
     
     for process in processes:
         text += f"👤 **User ID:** `{process['user_id']}`\n"
@@ -366,6 +394,25 @@ async def processes_command(client: Client, message: Message):
     await message.reply_text(text)
 
 
+@Client.on_message(filters.command("diskusage") & filters.private)
+async def disk_usage_command(client: Client, message: Message):
+    """Show scratch disk usage and reservations"""
+    if not is_admin(message.from_user.id):
+        await message.reply_text("❌ This command is for admins only!")
+        return
+    
+    usage = await disk_budget.usage()
+    
+    text = "💾 **Disk Usage**\n\n"
+    text += f"**Volume:** {format_size(usage['volume_total'] - usage['volume_free'])} used / {format_size(usage['volume_total'])}\n"
+    text += f"**Free:** {format_size(usage['volume_free'])}\n\n"
+    text += f"**Scratch Folder:** {format_size(usage['scratch_used'])}\n"
+    text += f"**Job Budget:** {format_size(usage['budget'])}\n"
+    text += f"**Reserved:** {format_size(usage['reserved'])} by {usage['jobs']} job(s)\n"
+    
+    await message.reply_text(text)
+
+
 # Keep existing premium management commands
 @Client.on_message(filters.command("addpremium") & filters.private)
 async def add_premium_command(client: Client, message: Message):
@@ -398,7 +445,7 @@ async def add_premium_command(client: Client, message: Message):
             await message.reply_text("❌ Duration must be 1, 7, or 30 days!")
             return
         
-        user = users_collection.find_one({"id": target_user_id})
+        user = await get_user(target_user_id)
         
         if not user:
             await message.reply_text(f"❌ User {target_user_id} not found in database!\nThey need to /start the bot first.")
@@ -434,10 +481,7 @@ async def add_premium_command(client: Client, message: Message):
             action = "activated"
         
         # Update user tier
-        users_collection.update_one(
-            {"id": target_user_id},
-            {"$set": {"tier": plan_type, "premium_expiry": premium_expiry}}
-        )
+        await update_user(target_user_id, {"tier": plan_type, "premium_expiry": premium_expiry})
         
         # Create status message
         if action == "upgraded":
@@ -488,16 +532,13 @@ async def remove_premium_command(client: Client, message: Message):
         
         target_user_id = int(parts[1])
         
-        user = users_collection.find_one({"id": target_user_id})
+        user = await get_user(target_user_id)
         
         if not user:
             await message.reply_text(f"❌ User {target_user_id} not found!")
             return
         
-        users_collection.update_one(
-            {"id": target_user_id},
-            {"$set": {"tier": "free", "premium_expiry": None}}
-        )
+        await update_user(target_user_id, {"tier": "free", "premium_expiry": None})
         
         await message.reply_text(f"✅ Premium removed from user {target_user_id}")
         
@@ -584,13 +625,13 @@ async def add_force_sub_command(client: Client, message: Message):
             return
         
         # Check if already exists
-        existing = force_sub_channels_collection.find_one({"channel_id": channel_id})
+        existing = await get_force_sub_channel(channel_id)
         if existing:
             await message.reply_text(f"⚠️ Channel **{channel_title}** is already in force sub list!")
             return
         
         # Check limit
-        count = force_sub_channels_collection.count_documents({})
+        count = await count_force_sub_channels()
         if count >= MAX_FORCE_SUB_CHANNELS:
             await message.reply_text(f"❌ Maximum {MAX_FORCE_SUB_CHANNELS} channels allowed!")
             return
@@ -607,7 +648,8 @@ async def add_force_sub_command(client: Client, message: Message):
             channel_data["username"] = channel_username
         
         # Add channel
-        force_sub_channels_collection.insert_one(channel_data)
+        await add_force_sub_channel(channel_data)
+        invalidate_force_sub_cache()
         
         # Build success message
         success_msg = (
@@ -652,7 +694,7 @@ async def remove_force_sub_command(client: Client, message: Message):
             await message.reply_text("❌ Invalid channel ID! Must be a number like -1001234567890")
             return
         
-        channel = force_sub_channels_collection.find_one({"channel_id": channel_id})
+        channel = await get_force_sub_channel(channel_id)
         
         if not channel:
             await message.reply_text(
@@ -661,7 +703,8 @@ async def remove_force_sub_command(client: Client, message: Message):
             )
             return
         
-        force_sub_channels_collection.delete_one({"channel_id": channel_id})
+        await remove_force_sub_channel(channel_id)
+        invalidate_force_sub_cache()
         
         await message.reply_text(
             f"✅ **Channel Removed!**\n\n"
@@ -681,7 +724,7 @@ async def list_force_sub_command(client: Client, message: Message):
         await message.reply_text("❌ This command is for admins only!")
         return
     
-    channels = list(force_sub_channels_collection.find())
+    channels = await list_force_sub_channels()
     
     if not channels:
         await message.reply_text("📋 No force subscription channels configured.")
@@ -723,11 +766,7 @@ async def set_log_channel_command(client: Client, message: Message):
             return
         
         # Update or insert config
-        bot_config_collection.update_one(
-            {"setting_name": "log_channel"},
-            {"$set": {"setting_value": str(channel_id)}},
-            upsert=True
-        )
+        await set_config("log_channel", {"setting_value": str(channel_id)})
         
         await message.reply_text(
             f"✅ **Log Channel Set!**\n\n"
@@ -747,25 +786,21 @@ async def premium_users_command(client: Client, message: Message):
         return
     
     # Get all premium and ultra premium users
-    premium_users = list(users_collection.find({
-        "tier": {"$in": ["premium", "ultra_premium"]}
-    }).sort("premium_expiry", -1))
+    premium_users = await users.find(
+        {"tier": {"$in": ["premium", "ultra_premium"]}},
+        sort=[("premium_expiry", -1)]
+    )
     
     if not premium_users:
         await message.reply_text("📋 No premium users found.")
         return
     
-    # Check for expired premiums and update
-    active_premium = []
-    for user in premium_users:
-        if user.get('premium_expiry') and user['premium_expiry'] < datetime.utcnow():
-            # Expire this user
-            users_collection.update_one(
-                {"id": user['id']},
-                {"$set": {"tier": "free", "premium_expiry": None}}
-            )
-        else:
-            active_premium.append(user)
+    # Skip expired premiums, the background sweeper downgrades them
+    now = datetime.utcnow()
+    active_premium = [
+        user for user in premium_users
+        if not (user.get('premium_expiry') and user['premium_expiry'] < now)
+    ]
     
     if not active_premium:
         await message.reply_text("📋 No active premium users found.")
@@ -793,23 +828,19 @@ async def stats_command(client: Client, message: Message):
         await message.reply_text("❌ This command is for admins only!")
         return
     
-    total_users = users_collection.count_documents({})
-    active_users = users_collection.count_documents({"is_banned": {"$ne": True}})
-    free_users = users_collection.count_documents({"tier": "free"})
-    premium_users = users_collection.count_documents({"tier": "premium"})
-    ultra_users = users_collection.count_documents({"tier": "ultra_premium"})
-    total_downloads = downloads_collection.count_documents({})
-    
-    # Total data processed
-    pipeline = [
-        {"$group": {"_id": None, "total": {"$sum": "$size"}}}
-    ]
-    result = list(downloads_collection.aggregate(pipeline))
-    total_bytes = result[0]['total'] if result else 0
+    # One pass over users, running totals for everything else
+    breakdown = await get_user_breakdown()
+    counters = await get_counters()
     
-    # Redeem codes stats
-    total_codes = redeem_codes_collection.count_documents({})
-    used_codes = redeem_codes_collection.count_documents({"is_used": True})
+    total_users = breakdown['total']
+    active_users = breakdown['active']
+    free_users = breakdown['tiers'].get('free', 0)
+    premium_users = breakdown['tiers'].get('premium', 0)
+    ultra_users = breakdown['tiers'].get('ultra_premium', 0)
+    total_downloads = counters.get('extractions', 0)
+    total_bytes = counters.get('bytes_processed', 0)
+    total_codes = counters.get('codes_total', 0)
+    used_codes = counters.get('codes_used', 0)
     
     text = "📊 **Bot Statistics**\n\n"
     text += f"👥 **Total Users:** {total_users}\n"
@@ -822,6 +853,12 @@ async def stats_command(client: Client, message: Message):
     text += f"🎫 **Redeem Codes:**\n"
     text += f"   • Total: {total_codes}\n"
     text += f"   • Used: {used_codes}\n"
-    text += f"   • Available: {total_codes - used_codes}\n"
+    text += f"   • Available: {total_codes - used_codes}\n\n"
+    
+    cache_stats = get_settings_cache_stats()
+    text += "🗄️ **Settings Cache:**\n"
+    text += f"   • Cached: {cache_stats['size']}/{cache_stats['maxsize']}\n"
+    text += f"   • Hits: {cache_stats['hits']} ({cache_stats['hit_rate']:.0f}%)\n"
+    text += f"   • Misses: {cache_stats['misses']}\n"
     
     await message.reply_text(text)
@@ -0,0 +1,336 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from plugins.force_sub import check_force_subscription
+from plugins.cancel import start_process, end_process, is_cancelled, has_active_process
+from plugins.unzip import handle_file_extraction, progress_callback, MAX_FILES_PER_ARCHIVE
+from utils.file_handler import download_file, list_archive, cleanup_files
+from utils.quota_manager import check_quota
+from utils.job_scheduler import job_scheduler
+from utils.disk_budget import disk_budget, DiskBudgetError
+from utils.remote_zip import RemoteZip
+from utils.helpers import format_size
+from utils.status_editor import StatusEditor
+import time
+import re
+import asyncio
+import functools
+
+
+MEMBERS_PER_PAGE = 8
+MAX_NAME_LENGTH = 28
+SESSION_TIMEOUT_SECONDS = 15 * 60
+
+# Open archive browsers, by user ID
+browse_sessions = {}
+
+
+def parse_password(text):
+    """Password from `/list "password"`, or None"""
+    command_text = text.split(maxsplit=1)
+    if len(command_text) < 2:
+        return None
+    password_input = command_text[1].strip()
+    match = re.search(r'["\'](.*?)["\']', password_input)
+    return match.group(1) if match else password_input
+
+
+def short_name(name):
+    """Member name shortened to fit a button"""
+    name = name.rstrip('/').rsplit('/', 1)[-1]
+    if len(name) > MAX_NAME_LENGTH:
+        return name[:MAX_NAME_LENGTH - 3] + '...'
+    return name
+
+
+def browser_text(session):
+    """Header text of the archive browser"""
+    members = session['members']
+    total_size = sum(member['size'] for member in members)
+    return (
+        f"🗂️ **Archive Browser**\n\n"
+        f"**File:** `{session['file_name']}`\n"
+        f"**Files:** {len(members)} ({format_size(total_size)} unpacked)\n"
+        f"**Selected:** {len(session['selected'])} / {MAX_FILES_PER_ARCHIVE} max\n\n"
+        f"Tap files to select them, then press Extract."
+    )
+
+
+def browser_keyboard(session):
+    """Inline keyboard for the current page of the archive browser"""
+    members = session['members']
+    pages = max(1, -(-len(members) // MEMBERS_PER_PAGE))
+    page = min(session['page'], pages - 1)
+    start = page * MEMBERS_PER_PAGE
+    
+    buttons = []
+    for position, member in enumerate(members[start:start + MEMBERS_PER_PAGE], start):
+        mark = "✅" if member['index'] in session['selected'] else "⬜"
+        label = f"{mark} {short_name(member['name'])} · {format_size(member['size'])}"
+        buttons.append([InlineKeyboardButton(label, callback_data=f"ls_t:{position}")])
+    
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=f"ls_p:{page - 1}"))
+    nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="ls_noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("➡️", callback_data=f"ls_p:{page + 1}"))
+    buttons.append(nav)
+    
+    buttons.append([
+        InlineKeyboardButton(f"📤 Extract ({len(session['selected'])})", callback_data="ls_go"),
+        InlineKeyboardButton("❌ Close", callback_data="ls_x")
+    ])
+    return InlineKeyboardMarkup(buttons)
+
+
+async def close_session(user_id, session):
+    """Forget a browser session, delete its downloaded archive and free its disk space"""
+    if browse_sessions.get(user_id) is session:
+        del browse_sessions[user_id]
+    await cleanup_files([session['file_path']], reservation_key=session['reservation_key'])
+
+
+async def expire_session(user_id, session):
+    """Close an abandoned browser session after the timeout"""
+    await asyncio.sleep(SESSION_TIMEOUT_SECONDS)
+    if browse_sessions.get(user_id) is session:
+        await close_session(user_id, session)
+        try:
+            await session['browser_msg'].edit_text("⌛ Archive browser closed after inactivity.")
+        except Exception:
+            pass
+
+
+@Client.on_message(filters.command("list") & filters.private)
+async def list_command(client: Client, message: Message):
+    """Handle /list command - browse an archive and pick files to extract"""
+    user_id = message.from_user.id
+    
+    # Check force subscription
+    is_subscribed, buttons = await check_force_subscription(client, user_id)
+    if not is_subscribed:
+        await message.reply_text(
+            "❌ **Access Denied!**\n\n"
+            "You must join the following channels to use this bot:",
+            reply_markup=buttons
+        )
+        return
+    
+    if not message.reply_to_message or not message.reply_to_message.document:
+        await message.reply_text(
+            "❌ **Invalid Usage!**\n\n"
+            "Reply to an archive file with:\n"
+            "• `/list` - browse files and choose what to extract\n"
+            "• `/list \"password\"` - for password-protected files"
+        )
+        return
+    
+    file_message = message.reply_to_message
+    file_name = file_message.document.file_name or "archive"
+    ext = file_name.lower().rsplit('.', 1)[-1] if '.' in file_name else ''
+    if ext not in ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'tgz', 'tbz2']:
+        await message.reply_text(
+            f"❌ **Unsupported File Type!**\n\n"
+            f"File: `{file_name}`\n"
+            f"Extension: `.{ext}`"
+        )
+        return
+    
+    # /cancel must keep reaching a running job
+    if has_active_process(user_id):
+        await message.reply_text(
+            "⏳ **Process Running!**\n\n"
+            "Wait for your current process to finish, or stop it with /cancel."
+        )
+        return
+    
+    # Same limits as extracting it, checked before anything is downloaded;
+    # the quota itself is taken when the selection is extracted
+    file_size = file_message.document.file_size
+    can_proceed, quota_msg, tier = await check_quota(user_id, file_size)
+    if not can_proceed:
+        await message.reply_text(quota_msg)
+        return
+    
+    if user_id in browse_sessions:
+        await close_session(user_id, browse_sessions[user_id])
+    
+    password = parse_password(message.text)
+    start_process(user_id, 'listing', filename=file_name)
+    status_msg = await message.reply_text(
+        f"🗂️ **Reading Archive**\n\n"
+        f"**File:** `{file_name}`\n\n"
+        f"⏳ Downloading...\n\n"
+        f"Use /cancel to stop"
+    )
+    
+    status = StatusEditor(status_msg)
+    file_path = None
+    remote = None
+    members = None
+    job_slot_acquired = False
+    # The session keeps this reservation until it closes or its job takes it over
+    reservation_key = f"{user_id}:list:{status_msg.id}"
+    try:
+        async def show_queue_position(position):
+            if is_cancelled(user_id):
+                raise Exception("Process cancelled by user")
+            status.update(
+                f"⏳ **Queued**\n\n"
+                f"**File:** `{file_name}`\n"
+                f"**Position:** {position}\n\n"
+                f"Use /cancel to stop"
+            )
+        
+        async def show_disk_wait():
+            if is_cancelled(user_id):
+                raise Exception("Process cancelled by user")
+            status.update(
+                f"💾 **Waiting for Disk Space**\n\n"
+                f"**File:** `{file_name}`\n\n"
+                f"Use /cancel to stop"
+            )
+        
+        # The download counts against the job limit and the disk budget
+        await job_scheduler.acquire(user_id, tier, on_wait=show_queue_position)
+        job_slot_acquired = True
+        await disk_budget.reserve(reservation_key, file_size, on_wait=show_disk_wait)
+        
+        start_time = time.time()
+        
+        async def progress_wrapper(current, total):
+            await progress_callback(current, total, status, start_time, user_id, "Downloading")
+        
+        if ext == 'zip':
+            # Only the central directory is needed to list a ZIP
+            try:
+                remote = await RemoteZip.open(client, file_message)
+                file_path = remote.file_path
+            except Exception as e:
+                if "cancelled" in str(e).lower():
+                    raise
+                remote = None
+        
+        if not file_path:
+            file_path, _, _ = await download_file(client, file_message, progress_wrapper)
+        if not file_path:
+            await status.set("❌ Failed to download file!")
+            return
+        
+        if is_cancelled(user_id):
+            await status.set("⏸️ Process cancelled by user.")
+            return
+        
+        members = await list_archive(file_path, password)
+        if not members:
+            await status.set("❌ Archive is empty!")
+    except DiskBudgetError as e:
+        await status.set(
+            f"💾 **Server Storage Busy**\n\n"
+            f"{str(e)}.\n\n"
+            f"Please try again later."
+        )
+    except Exception as e:
+        if "cancelled" in str(e).lower():
+            await status.set("⏸️ Process cancelled by user.")
+        else:
+            await status.set(f"❌ Could not read the archive: {str(e)}")
+    finally:
+        end_process(user_id)
+        if job_slot_acquired:
+            job_scheduler.release()
+        if not members:
+            # No session to keep the archive for
+            await cleanup_files([file_path] if file_path else [], reservation_key=reservation_key)
+    
+    if not members:
+        return
+    
+    session = {
+        'message': message,
+        'file_message': file_message,
+        'file_name': file_name,
+        'file_path': file_path,
+        'password': password,
+        'remote': remote,
+        'reservation_key': reservation_key,
+        'members': members,
+        'selected': set(),
+        'page': 0,
+        'browser_msg': status_msg
+    }
+    browse_sessions[user_id] = session
+    asyncio.create_task(expire_session(user_id, session))
+    
+    await status.set(browser_text(session), reply_markup=browser_keyboard(session))
+
+
+@Client.on_callback_query(filters.regex(r"^ls_"))
+async def browse_callback(client: Client, callback_query: CallbackQuery):
+    """Handle archive browser buttons"""
+    user_id = callback_query.from_user.id
+    data = callback_query.data
+    session = browse_sessions.get(user_id)
+    
+    if not session or session['browser_msg'].id != callback_query.message.id:
+        await callback_query.answer("This browser has expired, use /list again.", show_alert=True)
+        return
+    
+    if data == "ls_noop":
+        await callback_query.answer()
+        return
+    
+    if data == "ls_x":
+        await close_session(user_id, session)
+        await callback_query.message.edit_text("❌ Archive browser closed.")
+        return
+    
+    if data.startswith("ls_p:"):
+        session['page'] = int(data.split(":", 1)[1])
+    
+    elif data.startswith("ls_t:"):
+        member = session['members'][int(data.split(":", 1)[1])]
+        if member['index'] in session['selected']:
+            session['selected'].discard(member['index'])
+        elif len(session['selected']) >= MAX_FILES_PER_ARCHIVE:
+            await callback_query.answer(f"You can pick up to {MAX_FILES_PER_ARCHIVE} files.", show_alert=True)
+            return
+        else:
+            session['selected'].add(member['index'])
+    
+    elif data == "ls_go":
+        if not session['selected']:
+            await callback_query.answer("Select at least one file first!", show_alert=True)
+            return
+        
+        # The extraction job takes over the downloaded archive and its reservation
+        del browse_sessions[user_id]
+        await callback_query.answer()
+        await callback_query.message.edit_text(
+            f"📤 Extracting {len(session['selected'])} selected file(s) from `{session['file_name']}`..."
+        )
+        try:
+            await handle_file_extraction(
+                client,
+                session['message'],
+                session['file_message'],
+                session['password'],
+                members=sorted(session['selected']),
+                file_path=session['file_path'],
+                # ZIPs were only partly downloaded, fetch the picked members
+                downloader=(
+                    functools.partial(session['remote'].fetch_members, sorted(session['selected']))
+                    if session['remote'] else None
+                ),
+                reservation_key=session['reservation_key']
+            )
+        finally:
+            # Still on disk if the job was rejected before it started
+            await cleanup_files([session['file_path']], reservation_key=session['reservation_key'])
+        return
+    
+    await callback_query.answer()
+    try:
+        await callback_query.message.edit_text(browser_text(session), reply_markup=browser_keyboard(session))
+    except Exception:
+        pass  # Unchanged page
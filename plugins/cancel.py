@@ -1,5 +1,7 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
+from utils.cancel_token import CancelToken
+import time
 
 
 # Dictionary to store ongoing processes
@@ -18,24 +20,37 @@ async def cancel_command(client: Client, message: Message):
     # Mark process for cancellation INSTANTLY
     user_processes[user_id]['cancel_requested'] = True
     user_processes[user_id]['active'] = False  # Mark as inactive immediately
+    user_processes[user_id]['token'].cancel()  # Also stops running extraction workers
     
     await message.reply_text("✅ **Cancellation initiated!**\n\nYour process is being stopped...")
 
 
 def start_process(user_id, process_type, **kwargs):
-    """Register a new process for a user"""
+    """
+    Register a new process for a user
+    Returns: the process's CancelToken
+    """
+    token = CancelToken(f"{user_id}_{int(time.time() * 1000)}")
     user_processes[user_id] = {
         'active': True,
         'cancel_requested': False,
+        'token': token,
         'type': process_type,
         **kwargs
     }
+    return token
 
 
 def end_process(user_id):
     """End a process for a user"""
     if user_id in user_processes:
         user_processes[user_id]['active'] = False
+        user_processes[user_id]['token'].close()
+
+
+def has_active_process(user_id):
+    """Check if the user has a process running"""
+    return bool(user_processes.get(user_id, {}).get('active'))
 
 
 def is_cancelled(user_id):
@@ -1,92 +1,152 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from pyrogram.errors import UserNotParticipant, ChatAdminRequired, ChannelPrivate
-from database.database import force_sub_channels_collection
+from database.repository import list_force_sub_channels
+from utils.cache import TTLCache, MISSING
+from config import MAX_FORCE_SUB_CHANNELS, FORCE_SUB_MEMBER_TTL, FORCE_SUB_NOT_MEMBER_TTL, FORCE_SUB_CHANNELS_TTL
+import asyncio
 
 
-async def check_force_subscription(client: Client, user_id: int):
+# Channel list, per-user membership and private channel invite links are
+# reused across jobs so a busy bot doesn't spend its Telegram API budget here
+channels_cache = TTLCache(1, FORCE_SUB_CHANNELS_TTL)
+membership_cache = TTLCache(50000, FORCE_SUB_MEMBER_TTL)  # (user_id, channel_id) -> bool
+invite_link_cache = TTLCache(MAX_FORCE_SUB_CHANNELS * 4, FORCE_SUB_CHANNELS_TTL)  # channel_id -> (link, title)
+
+
+def invalidate_force_sub_cache():
+    """Forget cached channels, memberships and invite links after a channel change"""
+    channels_cache.clear()
+    membership_cache.clear()
+    invite_link_cache.clear()
+
+
+async def get_force_sub_channels():
+    """Get the force sub channels (up to 4), cached"""
+    channels = channels_cache.get('channels')
+    if channels is MISSING:
+        channels = await list_force_sub_channels(limit=MAX_FORCE_SUB_CHANNELS)
+        channels_cache.set('channels', channels)
+    return channels
+
+
+async def is_member(client: Client, channel: dict, user_id: int, recheck_negative=False):
+    """
+    Check whether the user has joined one channel
+    
+    Definite answers are cached, "not joined" only briefly. Errors are not
+    cached and count as not subscribed.
+    """
+    channel_identifier = channel.get('username') or channel.get('channel_id')
+    key = (user_id, channel.get('channel_id'))
+    
+    cached = membership_cache.get(key)
+    if cached is True or (cached is False and not recheck_negative):
+        return cached
+    
+    try:
+        member = await client.get_chat_member(channel_identifier, user_id)
+        # Check if user is actually a member
+        joined = member.status not in ['left', 'kicked', 'banned']
+    except UserNotParticipant:
+        # User is definitely not a member
+        joined = False
+    except Exception as e:
+        # Any other error, assume not subscribed
+        print(f"Error checking subscription for {channel_identifier}: {e}")
+        return False
+    
+    membership_cache.set(key, joined, ttl=None if joined else FORCE_SUB_NOT_MEMBER_TTL)
+    return joined
+
+
+async def get_invite_button(client: Client, channel: dict):
+    """Build the join button for a channel, resolving private invite links once"""
+    channel_identifier = channel.get('username') or channel.get('channel_id')
+    channel_title = channel.get('channel_title', 'Channel')
+    
+    # Determine invite link
+    if channel.get('username'):
+        # Public channel - use username
+        return InlineKeyboardButton(f"📢 {channel_title}", url=f"https://t.me/{channel['username']}")
+    
+    cached = invite_link_cache.get(channel.get('channel_id'))
+    if cached is not MISSING:
+        invite_link, channel_title = cached
+        return InlineKeyboardButton(f"📢 {channel_title}", url=invite_link)
+    
+    # Private channel - need to get invite link
+    try:
+        chat = await client.get_chat(channel_identifier)
+        invite_link = chat.invite_link
+        
+        if not invite_link:
+            # Try to export link if bot is admin
+            try:
+                invite_link = await client.export_chat_invite_link(channel_identifier)
+            except:
+                # Fallback
+                invite_link = f"https://t.me/c/{str(channel.get('channel_id', '')).replace('-100', '')}"
+        
+        # Update title from chat if available
+        if chat.title:
+            channel_title = chat.title[:20]
+        
+        invite_link_cache.set(channel.get('channel_id'), (invite_link, channel_title))
+    except Exception as e:
+        print(f"Error getting chat info: {e}")
+        # Use stored invite link or skip
+        invite_link = channel.get('invite_link', f"https://t.me/{channel.get('username', '')}")
+    
+    return InlineKeyboardButton(f"📢 {channel_title}", url=invite_link)
+
+
+async def check_force_subscription(client: Client, user_id: int, recheck_negative=False):
     """
     Check if user is subscribed to all force sub channels (up to 4)
+    
+    Channels are checked concurrently. Pass recheck_negative=True to ignore
+    cached "not joined" results, e.g. when the user says they just joined.
     Returns: (is_subscribed: bool, buttons: InlineKeyboardMarkup)
     """
-    channels = list(force_sub_channels_collection.find().limit(4))
+    channels = await get_force_sub_channels()
     
     if not channels:
         return True, None
     
-    not_subscribed = []
-    
-    for channel in channels:
-        try:
-            # Use username or channel_id as identifier
-            channel_identifier = channel.get('username') or channel.get('channel_id')
-            
-            # Try to get chat member status
-            try:
-                member = await client.get_chat_member(channel_identifier, user_id)
-                # Check if user is actually a member
-                if member.status in ['left', 'kicked', 'banned']:
-                    not_subscribed.append(channel)
-            except UserNotParticipant:
-                # User is definitely not a member
-                not_subscribed.append(channel)
-            except Exception as e:
-                # Any other error, assume not subscribed
-                print(f"Error checking subscription for {channel_identifier}: {e}")
-                not_subscribed.append(channel)
-                
-        except Exception as e:
-            print(f"Error processing channel: {e}")
-            not_subscribed.append(channel)
+    results = await asyncio.gather(
+        *(is_member(client, channel, user_id, recheck_negative) for channel in channels),
+        return_exceptions=True
+    )
+    not_subscribed = [
+        channel for channel, joined in zip(channels, results)
+        if joined is not True
+    ]
     
     if not_subscribed:
+        buttons = await asyncio.gather(
+            *(get_invite_button(client, channel) for channel in not_subscribed),
+            return_exceptions=True
+        )
+        
         # Create buttons with 2 columns layout
         buttons_list = []
         row = []
         
-        for idx, channel in enumerate(not_subscribed):
-            try:
-                # Get channel info
-                channel_identifier = channel.get('username') or channel.get('channel_id')
-                channel_title = channel.get('channel_title', 'Channel')
-                
-                # Determine invite link
-                if channel.get('username'):
-                    # Public channel - use username
-                    invite_link = f"https://t.me/{channel['username']}"
-                else:
-                    # Private channel - need to get invite link
-                    try:
-                        chat = await client.get_chat(channel_identifier)
-                        invite_link = chat.invite_link
-                        
-                        if not invite_link:
-                            # Try to export link if bot is admin
-                            try:
-                                invite_link = await client.export_chat_invite_link(channel_identifier)
-                            except:
-                                # Fallback
-                                invite_link = f"https://t.me/c/{str(channel.get('channel_id', '')).replace('-100', '')}"
-                        
-                        # Update title from chat if available
-                        if chat.title:
-                            channel_title = chat.title[:20]
-                    except Exception as e:
-                        print(f"Error getting chat info: {e}")
-                        # Use stored invite link or skip
-                        invite_link = channel.get('invite_link', f"https://t.me/{channel.get('username', '')}")
-                
-                # Create button
-                button = InlineKeyboardButton(f"📢 {channel_title}", url=invite_link)
-                row.append(button)
-                
-                # Add row when we have 2 buttons or it's the last one
-                if len(row) == 2 or idx == len(not_subscribed) - 1:
-                    buttons_list.append(row)
-                    row = []
-                    
-            except Exception as e:
-                print(f"Error creating button for channel: {e}")
+        for button in buttons:
+            if isinstance(button, Exception):
+                print(f"Error creating button for channel: {button}")
+                continue
+            
+            row.append(button)
+            
+            # Add row when we have 2 buttons
+            if len(row) == 2:
+                buttons_list.append(row)
+                row = []
+        
+        if row:
+            buttons_list.append(row)
         
         # Add verification button at the end
         buttons_list.append([InlineKeyboardButton("✅ I Joined, Verify", callback_data="verify_subscription")])
@@ -105,8 +165,8 @@ async def verify_subscription_callback(client: Client, callback_query: CallbackQ
     # Show loading message
     await callback_query.answer("Checking your subscription...", show_alert=False)
     
-    # Re-check subscription
-    is_subscribed, buttons = await check_force_subscription(client, user_id)
+    # Re-check subscription, the user says they have just joined
+    is_subscribed, buttons = await check_force_subscription(client, user_id, recheck_negative=True)
     
     if is_subscribed:
         await callback_query.message.edit_text(
@@ -10,7 +10,7 @@ async def myplan_command(client: Client, message: Message):
     """Handle /myplan command"""
     user_id = message.from_user.id
     
-    stats = get_user_stats(user_id)
+    stats = await get_user_stats(user_id)
     
     if not stats:
         await message.reply_text("❌ Please use /start first to register.")
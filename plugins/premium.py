@@ -1,10 +1,12 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from database.database import users_collection, bot_config_collection
+from database.repository import get_config, set_config
+from utils.cache import TTLCache, MISSING
 from datetime import datetime
 import qrcode
 import io
 import os
+import asyncio
 
 # Pricing configuration (in INR and USDT)
 PRICING = {
@@ -23,6 +25,46 @@ PRICING = {
 # Store user purchase states
 purchase_states = {}
 
+# Telegram file_ids of sent UPI QR codes, by payment URL (user, plan and
+# amount); cleared by /setupi
+upi_qr_cache = TTLCache(maxsize=5000, ttl=7 * 24 * 3600)
+
+
+def render_qr_png(data):
+    """Render a QR code as PNG (blocking, CPU bound)"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    bio = io.BytesIO()
+    img.save(bio, 'PNG')
+    bio.seek(0)
+    bio.name = "upi_qr.png"
+    return bio
+
+
+async def send_upi_qr(client, user_id, upi_url, **kwargs):
+    """
+    Send the QR code of a UPI payment URL as a photo
+    
+    Each URL is rendered and uploaded once, later sends (the user going
+    back and picking the same plan again) reuse the photo's file_id.
+    """
+    file_id = upi_qr_cache.get(upi_url)
+    if file_id is not MISSING:
+        try:
+            return await client.send_photo(user_id, photo=file_id, **kwargs)
+        except Exception:
+            upi_qr_cache.invalidate(upi_url)  # Stale file_id, upload it again
+    
+    loop = asyncio.get_event_loop()
+    bio = await loop.run_in_executor(None, render_qr_png, upi_url)
+    sent_msg = await client.send_photo(user_id, photo=bio, **kwargs)
+    if sent_msg and sent_msg.photo:
+        upi_qr_cache.set(upi_url, sent_msg.photo.file_id)
+    return sent_msg
+
 
 @Client.on_message(filters.command("premium") & filters.private)
 async def premium_command(client: Client, message: Message):
@@ -225,7 +267,7 @@ async def purchase_callback(client: Client, callback_query: CallbackQuery):
         plan_name = "Premium" if plan_type == "premium" else "Ultra Premium"
         
         # Get UPI details from config
-        upi_config = bot_config_collection.find_one({"setting_name": "upi_payment"})
+        upi_config = await get_config("upi_payment")
         
         if not upi_config:
             await callback_query.answer("UPI payment not configured. Please contact admin.", show_alert=True)
@@ -237,18 +279,9 @@ async def purchase_callback(client: Client, callback_query: CallbackQuery):
         # Generate payment note
         payment_note = f"UNZIP{user_id}{duration}D"
         
-        # Generate UPI QR code
+        # UPI QR code with the payment note filled in
         upi_url = f"upi://pay?pa={upi_id}&pn={bank_name}&am={price_inr}&tn={payment_note}"
         
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(upi_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        bio = io.BytesIO()
-        img.save(bio, 'PNG')
-        bio.seek(0)
-        
         # Admin contact button
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("📤 Send Payment Proof to Admin", url="https://t.me/LuciferJaat8")],
@@ -279,9 +312,10 @@ async def purchase_callback(client: Client, callback_query: CallbackQuery):
         )
         
         await callback_query.message.delete()
-        await client.send_photo(
+        await send_upi_qr(
+            client,
             user_id,
-            photo=bio,
+            upi_url,
             caption=caption,
             reply_markup=keyboard
         )
@@ -355,15 +389,14 @@ async def set_upi_command(client: Client, message: Message):
     bank_name = parts[2]
     
     # Store in database
-    bot_config_collection.update_one(
-        {"setting_name": "upi_payment"},
-        {"$set": {
-            "upi_id": upi_id,
-            "bank_name": bank_name,
-            "updated_at": datetime.utcnow()
-        }},
-        upsert=True
-    )
+    await set_config("upi_payment", {
+        "upi_id": upi_id,
+        "bank_name": bank_name,
+        "updated_at": datetime.utcnow()
+    })
+    
+    # QR codes of the old UPI ID must not be sent again
+    upi_qr_cache.clear()
     
     await message.reply_text(
         f"✅ **UPI Payment Configured!**\n\n"
@@ -1,6 +1,9 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database.database import redeem_codes_collection, users_collection
+from database.repository import increment_counters, claim_redeem_code, redeem_code_exists, get_user, update_user
+from utils.rate_limiter import RateLimiter
+from utils.helpers import format_duration
+from config import REDEEM_MAX_ATTEMPTS, REDEEM_ATTEMPT_WINDOW
 from datetime import datetime, timedelta
 import random
 import string
@@ -14,6 +17,9 @@ def generate_code():
 # Store user states for multi-step process
 user_states = {}
 
+# Limits code guessing, every attempt costs a database lookup
+redeem_limiter = RateLimiter(REDEEM_MAX_ATTEMPTS, REDEEM_ATTEMPT_WINDOW)
+
 
 @Client.on_message(filters.command("redeem") & filters.private)
 async def redeem_command(client: Client, message: Message):
@@ -32,23 +38,34 @@ async def redeem_command(client: Client, message: Message):
     
     code = parts[1].upper()
     
-    # Find the code
-    redeem_code = redeem_codes_collection.find_one({"code": code})
+    retry_after = redeem_limiter.hit(user_id)
+    if retry_after:
+        await message.reply_text(
+            f"⏳ **Too Many Attempts!**\n\n"
+            f"Please try again in {format_duration(retry_after)}."
+        )
+        return
     
-    if not redeem_code:
-        await message.reply_text("❌ Invalid redeem code!")
+    # Only registered users can hold a plan, check before using the code up
+    user = await get_user(user_id)
+    if not user:
+        await message.reply_text("Please use /start first to register.")
         return
     
-    if redeem_code.get('is_used'):
-        await message.reply_text("❌ This code has already been used!")
+    # Claim the code, only one user can ever get it
+    redeem_code = await claim_redeem_code(code, user_id)
+    
+    if not redeem_code:
+        if await redeem_code_exists(code):
+            await message.reply_text("❌ This code has already been used!")
+        else:
+            await message.reply_text("❌ Invalid redeem code!")
         return
     
     # Get code details
     plan_type = redeem_code['plan_type']
     duration_days = redeem_code['duration_days']
     
-    # Get current user data
-    user = users_collection.find_one({"id": user_id})
     current_tier = user.get('tier', 'free')
     current_expiry = user.get('premium_expiry')
     
@@ -78,16 +95,8 @@ async def redeem_command(client: Client, message: Message):
         action = "activated"
     
     # Update user
-    users_collection.update_one(
-        {"id": user_id},
-        {"$set": {"tier": plan_type, "premium_expiry": premium_expiry}}
-    )
-    
-    # Mark code as used
-    redeem_codes_collection.update_one(
-        {"code": code},
-        {"$set": {"is_used": True, "used_by": user_id, "used_date": datetime.utcnow()}}
-    )
+    await update_user(user_id, {"tier": plan_type, "premium_expiry": premium_expiry})
+    await increment_counters({"codes_used": 1})
     
     # Create response message
     if action == "upgraded":
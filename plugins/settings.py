@@ -75,7 +75,7 @@ async def settings_command(client: Client, message: Message):
             del user_input_states[user_id]
         
         # Get user settings
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         
         # Show menu
         await message.reply_text(
@@ -93,7 +93,7 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
     data = callback_query.data
     
     # Get current settings
-    settings = get_user_settings(user_id)
+    settings = await get_user_settings(user_id)
     
     if data == "settings_close":
         await callback_query.message.delete()
@@ -113,8 +113,8 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await show_upload_type_menu(callback_query, settings)
     
     elif data == "settings_upload_document":
-        update_user_settings(user_id, {"upload_as_document": True})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"upload_as_document": True})
+        settings = await get_user_settings(user_id)
         await callback_query.message.edit_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -122,8 +122,8 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer("✅ Upload type set to Document")
     
     elif data == "settings_upload_media":
-        update_user_settings(user_id, {"upload_as_document": False})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"upload_as_document": False})
+        settings = await get_user_settings(user_id)
         await callback_query.message.edit_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -152,8 +152,8 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer()
     
     elif data == "settings_caption_clear":
-        update_user_settings(user_id, {"custom_caption": None, "caption_entities": None})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"custom_caption": None, "caption_entities": None})
+        settings = await get_user_settings(user_id)
         await callback_query.message.edit_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -173,8 +173,8 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer()
     
     elif data == "settings_thumbnail_remove":
-        update_user_settings(user_id, {"thumbnail": None})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"thumbnail": None, "thumbnail_unique_id": None})
+        settings = await get_user_settings(user_id)
         await callback_query.message.edit_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -209,14 +209,14 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer()
     
     elif data == "settings_prefix_clear":
-        update_user_settings(user_id, {"filename_prefix": None})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"filename_prefix": None})
+        settings = await get_user_settings(user_id)
         await show_prefix_suffix_menu(callback_query, settings)
         await callback_query.answer("✅ Prefix cleared")
     
     elif data == "settings_suffix_clear":
-        update_user_settings(user_id, {"filename_suffix": None})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"filename_suffix": None})
+        settings = await get_user_settings(user_id)
         await show_prefix_suffix_menu(callback_query, settings)
         await callback_query.answer("✅ Suffix cleared")
     
@@ -258,14 +258,14 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer()
     
     elif data == "settings_caption_replace_clear":
-        update_user_settings(user_id, {"caption_replacements": ""})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"caption_replacements": ""})
+        settings = await get_user_settings(user_id)
         await show_caption_replace_menu(callback_query, settings)
         await callback_query.answer("✅ Caption replacements cleared")
     
     elif data == "settings_filename_replace_clear":
-        update_user_settings(user_id, {"filename_replacements": ""})
-        settings = get_user_settings(user_id)
+        await update_user_settings(user_id, {"filename_replacements": ""})
+        settings = await get_user_settings(user_id)
         await show_filename_replace_menu(callback_query, settings)
         await callback_query.answer("✅ Filename replacements cleared")
 
@@ -437,7 +437,7 @@ async def show_filename_replace_menu(callback_query, settings):
     await callback_query.answer()
 
 
-@Client.on_message(filters.private & filters.text & ~filters.command(["settings", "cancel", "start", "help", "unzip", "myplan", "premium", "redeem"]), group=10)
+@Client.on_message(filters.private & filters.text & ~filters.command(["settings", "cancel", "start", "help", "unzip", "list", "myplan", "premium", "redeem"]), group=10)
 async def handle_user_input(client: Client, message: Message):
     """Handle user text input for settings configuration"""
     user_id = message.from_user.id
@@ -464,14 +464,14 @@ async def handle_user_input(client: Client, message: Message):
             for entity in entities
         ] if entities else None
         
-        update_user_settings(user_id, {
+        await update_user_settings(user_id, {
             "custom_caption": caption,
             "caption_entities": entities_dict
         })
         
         del user_input_states[user_id]
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -479,12 +479,12 @@ async def handle_user_input(client: Client, message: Message):
     
     elif waiting_for == "prefix":
         prefix = message.text.strip()
-        update_user_settings(user_id, {"filename_prefix": prefix})
+        await update_user_settings(user_id, {"filename_prefix": prefix})
         del user_input_states[user_id]
         
         await message.reply_text(f"✅ Prefix set to: `{prefix}`\n\nA space will be added after it automatically.")
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -492,12 +492,12 @@ async def handle_user_input(client: Client, message: Message):
     
     elif waiting_for == "suffix":
         suffix = message.text.strip()
-        update_user_settings(user_id, {"filename_suffix": suffix})
+        await update_user_settings(user_id, {"filename_suffix": suffix})
         del user_input_states[user_id]
         
         await message.reply_text(f"✅ Suffix set to: `{suffix}`\n\nA space will be added before it automatically.")
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -505,12 +505,12 @@ async def handle_user_input(client: Client, message: Message):
     
     elif waiting_for == "caption_replacements":
         rules = message.text.strip()
-        update_user_settings(user_id, {"caption_replacements": rules})
+        await update_user_settings(user_id, {"caption_replacements": rules})
         del user_input_states[user_id]
         
         await message.reply_text(f"✅ Caption replacement rules set:\n`{rules}`")
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
@@ -518,19 +518,19 @@ async def handle_user_input(client: Client, message: Message):
     
     elif waiting_for == "filename_replacements":
         rules = message.text.strip()
-        update_user_settings(user_id, {"filename_replacements": rules})
+        await update_user_settings(user_id, {"filename_replacements": rules})
         del user_input_states[user_id]
         
         await message.reply_text(f"✅ Filename replacement rules set:\n`{rules}`")
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
         )
 
 
-@Client.on_message(filters.private & (filters.photo | filters.document) & ~filters.command(["settings", "cancel", "start", "help", "unzip"]), group=10)
+@Client.on_message(filters.private & (filters.photo | filters.document) & ~filters.command(["settings", "cancel", "start", "help", "unzip", "list"]), group=10)
 async def handle_photo_input(client: Client, message: Message):
     """Handle photo/document input for thumbnail"""
     user_id = message.from_user.id
@@ -543,9 +543,10 @@ async def handle_photo_input(client: Client, message: Message):
     if state.get("waiting_for") != "thumbnail":
         return
     
-    # Get file_id from photo or document
+    # Get file_id from photo or document, file_unique_id keys the local thumbnail cache
     if message.photo:
         file_id = message.photo.file_id
+        file_unique_id = message.photo.file_unique_id
     elif message.document:
         # Check if document is an image
         mime_type = message.document.mime_type or ""
@@ -553,17 +554,18 @@ async def handle_photo_input(client: Client, message: Message):
             await message.reply_text("❌ Please send an image file for thumbnail.")
             return
         file_id = message.document.file_id
+        file_unique_id = message.document.file_unique_id
     else:
         await message.reply_text("❌ Please send a photo or image file.")
         return
     
     # Save thumbnail
-    update_user_settings(user_id, {"thumbnail": file_id})
+    await update_user_settings(user_id, {"thumbnail": file_id, "thumbnail_unique_id": file_unique_id})
     del user_input_states[user_id]
     
     await message.reply_text("✅ Thumbnail saved successfully!")
     
-    settings = get_user_settings(user_id)
+    settings = await get_user_settings(user_id)
     await message.reply_text(
         get_settings_status_text(settings),
         reply_markup=get_main_menu_keyboard()
@@ -579,7 +581,7 @@ async def handle_cancel_input(client: Client, message: Message):
         del user_input_states[user_id]
         await message.reply_text("❌ Input cancelled.")
         
-        settings = get_user_settings(user_id)
+        settings = await get_user_settings(user_id)
         await message.reply_text(
             get_settings_status_text(settings),
             reply_markup=get_main_menu_keyboard()
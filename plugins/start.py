@@ -1,8 +1,7 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database.database import users_collection
+from database.repository import register_user
 from config import START_MESSAGE
-from datetime import datetime
 
 
 @Client.on_message(filters.command("start") & filters.private)
@@ -12,26 +11,7 @@ async def start_command(client: Client, message: Message):
     username = message.from_user.username
     first_name = message.from_user.first_name
     
-    # Check if user exists
-    user = users_collection.find_one({"id": user_id})
-    
-    if not user:
-        # Create new user
-        users_collection.insert_one({
-            "id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "join_date": datetime.utcnow(),
-            "tier": "free",
-            "daily_count": 0,
-            "last_reset": datetime.utcnow(),
-            "is_banned": False
-        })
-    else:
-        # Update user info and unban if they're back
-        users_collection.update_one(
-            {"id": user_id},
-            {"$set": {"username": username, "first_name": first_name, "is_banned": False}}
-        )
+    # Create new user, or update user info and unban if they're back
+    await register_user(user_id, username, first_name)
     
     await message.reply_text(START_MESSAGE)
@@ -1,20 +1,31 @@
 from pyrogram import Client, filters
-from pyrogram.types import Message
+from pyrogram.types import Message, MessageEntity
+from config import USER_LIMITS
 from plugins.force_sub import check_force_subscription
 from plugins.cancel import start_process, end_process, is_cancelled
-from utils.quota_manager import check_user_quota, check_file_size, increment_user_quota
-from utils.file_handler import download_file, extract_archive, get_all_files, cleanup_files, validate_file_type
+from utils.quota_manager import reserve_quota, release_quota, log_download
+from utils.file_handler import download_file, extract_archive, make_extract_dir, cleanup_files, validate_file_type, list_archive
+from utils.disk_budget import disk_budget, DiskBudgetError, estimate_unpacked_size, UNKNOWN_EXPANSION_RATIO
+from utils.extraction_engine import select_members, ExtractionProgress
+from utils.remote_zip import download_zip_members
+from utils.extraction_cache import (cache_key, get_cached_extraction, is_reusable, store_extraction,
+                                    invalidate_extraction, sent_file_record)
+from utils.upload_manager import OrderedUploader
+from utils.status_editor import StatusEditor
+from utils.thumbnail_cache import thumbnail_cache
+from utils.job_scheduler import job_scheduler
 from utils.helpers import format_size, format_duration, progress_bar
-from database.database import bot_config_collection
+from utils.filename_transformer import transform_filename, substitute_caption_variables, apply_replacements, get_file_type
+from database.repository import get_config
 import time
 import re
 import os
 import asyncio
+import functools
 
 
-# Track last progress update time per user
-last_progress_update = {}
 AUTO_DELETE_DELAY_SECONDS = 30 * 60
+MAX_FILES_PER_ARCHIVE = 50
 
 
 async def auto_delete_messages(client: Client, chat_id: int, message_ids: list, delay_seconds: int = AUTO_DELETE_DELAY_SECONDS):
@@ -27,8 +38,12 @@ async def auto_delete_messages(client: Client, chat_id: int, message_ids: list,
             pass
 
 
-async def progress_callback(current, total, message, start_time, user_id, action="Downloading"):
-    """Progress callback with minimal overhead to prevent timeouts"""
+async def progress_callback(current, total, status, start_time, user_id, action="Downloading"):
+    """
+    Progress callback with minimal overhead to prevent timeouts
+    
+    status is the job's StatusEditor, which decides when the text is sent.
+    """
     try:
         # Check for cancellation
         if is_cancelled(user_id):
@@ -38,17 +53,11 @@ async def progress_callback(current, total, message, start_time, user_id, action
         if current == total:
             return
         
-        current_time = time.time()
-        
-        # Only update every 10 seconds AND if at least 5% progress made
-        user_key = f"{user_id}_{action}"
-        last_update = last_progress_update.get(user_key, 0)
-        
-        if current_time - last_update < 10:
+        # Don't build a text that would only be merged away
+        if not status.ready():
             return
         
-        # Update the last update time
-        last_progress_update[user_key] = current_time
+        current_time = time.time()
         
         # Calculate stats
         elapsed = current_time - start_time
@@ -67,10 +76,7 @@ async def progress_callback(current, total, message, start_time, user_id, action
         )
         
         # Update message without blocking
-        try:
-            await message.edit_text(progress_text)
-        except:
-            pass
+        status.update(progress_text)
             
     except Exception as e:
         if "cancelled" in str(e).lower():
@@ -224,8 +230,21 @@ async def handle_telegram_link(client: Client, message: Message, link_text: str,
         )
 
 
-async def handle_file_extraction(client: Client, message: Message, file_message: Message, password: str):
-    """Handle file extraction process"""
+async def handle_file_extraction(client: Client, message: Message, file_message: Message, password: str,
+                                 members: list = None, file_path: str = None, downloader=None,
+                                 reservation_key: str = None):
+    """
+    Handle file extraction process
+    
+    members optionally selects archive members by listing index (from the
+    /list browser); file_path skips the download when the archive is
+    already on disk, and downloader (an async callable taking a progress
+    callback) completes a partial copy at file_path once the job starts.
+    ZIP documents are otherwise read remotely, fetching only the members
+    that will be delivered. The archive file is removed when the job ends.
+    reservation_key takes over the disk reservation that already covers
+    file_path, instead of starting a new one.
+    """
     user_id = message.from_user.id
     
     # Get file info
@@ -247,20 +266,14 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
         )
         return
     
-    # Check user quota
-    can_proceed, quota_msg, tier = check_user_quota(user_id)
+    # Check quota and file size, and reserve this file from the daily quota
+    can_proceed, quota_msg, tier = await reserve_quota(user_id, file_size)
     if not can_proceed:
         await message.reply_text(quota_msg)
         return
     
-    # Check file size
-    can_proceed, size_msg = check_file_size(user_id, file_size)
-    if not can_proceed:
-        await message.reply_text(size_msg)
-        return
-    
-    # Start process tracking
-    start_process(user_id, 'extraction', filename=file_name)
+    # Start process tracking, the token is shared by every stage of the job
+    cancel_token = start_process(user_id, 'extraction', filename=file_name)
     
     # Start processing
     status_msg = await message.reply_text(
@@ -271,313 +284,589 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
         f"Use /cancel to stop"
     )
     
-    file_path = None
     extract_dir = None
+    extraction_task = None
+    job_slot_acquired = False
+    quota_used = False
+    reservation_key = reservation_key or f"{user_id}:{status_msg.id}"
+    status = StatusEditor(status_msg)
     
     try:
+        # Get user settings for file transformations
+        from database.user_settings_helper import get_user_settings
+        
+        settings = await get_user_settings(user_id)
+        
+        # Get log channel
+        log_channel_id = await get_log_channel()
+        
+        # Resolve log channel to populate peer cache (fixes "Peer id invalid" error)
+        if log_channel_id:
+            try:
+                await client.get_chat(log_channel_id)
+            except Exception:
+                log_channel_id = None  # Disable logging if channel is inaccessible
+        
+        # Repeat requests for the same archive re-send the files uploaded last
+        # time, with no download, extraction or upload
+        cache_key_value = cache_key(file.file_unique_id, password, members)
+        cached = None
+        try:
+            cached = await get_cached_extraction(cache_key_value)
+        except Exception:
+            pass
+        
+        if cached and is_reusable(cached, settings):
+            sent_count, remaining = await deliver_cached_files(
+                client, message, status, cached, settings, log_channel_id
+            )
+            
+            if not remaining:
+                quota_used = True
+                await log_download(user_id, file_name, file_size)
+                await status.set(
+                    f"✅ **Extraction Complete!**\n\n"
+                    f"**Archive:** `{file_name}`\n"
+                    f"**Extracted:** {sent_count} file(s)\n\n"
+                    f"All files have been sent!\n"
+                    f"🗑️ Auto-delete is enabled (30 minutes)."
+                )
+                return
+            
+            # Cached files went stale, extract the rest the normal way
+            await invalidate_extraction(cache_key_value)
+            members = remaining
+            cache_key_value = None
+        
+        # Wait for a free job slot, premium tiers are admitted first
+        last_position = {}
+        
+        async def show_queue_position(position):
+            if is_cancelled(user_id):
+                raise Exception("Process cancelled by user")
+            if last_position.get('value') == position:
+                return
+            last_position['value'] = position
+            status.update(
+                f"⏳ **Queued**\n\n"
+                f"**File:** `{file_name}`\n"
+                f"**Position:** {position}\n\n"
+                f"The bot is busy right now. Your archive will start automatically.\n"
+                f"💎 Premium users skip ahead in the queue: /premium\n\n"
+                f"Use /cancel to stop"
+            )
+        
+        await job_scheduler.acquire(user_id, tier, on_wait=show_queue_position)
+        job_slot_acquired = True
+        
         # Check for cancellation
         if is_cancelled(user_id):
-            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            await status.set("⏸️ Process cancelled by user.")
             return
         
-        # Download file
+        # Reserve scratch space for the archive, waiting if the disk is busy
+        async def show_disk_wait():
+            if is_cancelled(user_id):
+                raise Exception("Process cancelled by user")
+            status.update(
+                f"💾 **Waiting for Disk Space**\n\n"
+                f"**File:** `{file_name}`\n\n"
+                f"Other jobs are using the server's storage. Your archive will start automatically.\n\n"
+                f"Use /cancel to stop"
+            )
+        
+        await disk_budget.reserve(reservation_key, file_size, on_wait=show_disk_wait)
+        
+        # Download file, unless the /list browser already did
         start_time = time.time()
         
         # Create progress wrapper
         async def progress_wrapper(current, total):
-            await progress_callback(current, total, status_msg, start_time, user_id, "Downloading")
+            await progress_callback(current, total, status, start_time, user_id, "Downloading")
         
-        file_path, _, _ = await download_file(
-            client,
-            file_message,
-            progress_wrapper
-        )
+        if downloader:
+            await downloader(progress_wrapper)
         
-        if not file_path:
-            await status_msg.edit_text("❌ Failed to download file!")
-            return
+        if not file_path and ext == 'zip':
+            # Fetch just the central directory and the members to deliver
+            try:
+                file_path = await download_zip_members(
+                    client, file_message, members, MAX_FILES_PER_ARCHIVE, progress_wrapper
+                )
+            except Exception as e:
+                if "cancelled" in str(e).lower():
+                    raise
+                file_path = None  # Not readable remotely, download it whole
         
-        # Check for cancellation
-        if is_cancelled(user_id):
-            await status_msg.edit_text("⏸️ Process cancelled by user.")
-            await cleanup_files([file_path])
-            return
+        if not file_path:
+            file_path, _, _ = await download_file(
+                client,
+                file_message,
+                progress_wrapper
+            )
         
-        # Extract archive
-        try:
-            await status_msg.edit_text("📂 Extracting archive...\n\nUse /cancel to stop")
-            
-            # Start a task to update status every 5 seconds during extraction
-            extraction_running = True
-            async def update_extraction_status():
-                elapsed = 0
-                while extraction_running:
-                    await asyncio.sleep(5)
-                    if extraction_running:  # Check again after sleep
-                        elapsed += 5
-                        try:
-                            await status_msg.edit_text(
-                                f"📂 Extracting archive... ({elapsed}s)\n\n"
-                                f"Please wait, large files may take several minutes.\n\n"
-                                f"Use /cancel to stop"
-                            )
-                        except:
-                            pass
-            
-            # Start the status update task
-            status_task = asyncio.create_task(update_extraction_status())
-            
-            try:
-                success, extract_dir, error_msg = await extract_archive(file_path, password)
-            finally:
-                extraction_running = False
-                await asyncio.sleep(0.1)  # Give status task time to see the flag
-                status_task.cancel()
-                try:
-                    await status_task
-                except asyncio.CancelledError:
-                    pass
-            
-            if not success:
-                await status_msg.edit_text(error_msg or "❌ Extraction failed!")
-                await cleanup_files([file_path])
-                return
-        except Exception as e:
-            await status_msg.edit_text(f"❌ Extraction error: {str(e)}")
-            await cleanup_files([file_path])
+        if not file_path:
+            await status.set("❌ Failed to download file!")
             return
         
         # Check for cancellation
         if is_cancelled(user_id):
-            await status_msg.edit_text("⏸️ Process cancelled by user.")
-            await cleanup_files([file_path, extract_dir])
-            return
-        
-        # Get extracted files
-        try:
-            await status_msg.edit_text("📋 Getting extracted files...\n\nUse /cancel to stop")
-            extracted_files = await get_all_files(extract_dir, max_files=50)
-        except Exception as e:
-            await status_msg.edit_text(f"❌ Error reading extracted files: {str(e)}")
-            await cleanup_files([file_path, extract_dir])
+            await status.set("⏸️ Process cancelled by user.")
+            await cleanup_files([file_path])
             return
         
-        if not extracted_files:
-            await status_msg.edit_text("❌ No files found in archive!")
-            await cleanup_files([file_path, extract_dir])
-            return
+        # Grow the reservation by the unpacked size of the members to deliver
+        await disk_budget.reserve(
+            reservation_key,
+            await estimate_job_disk_usage(file_path, password, ext, file_size, members),
+            on_wait=show_disk_wait
+        )
         
-        # Send files
-        total_files = len(extracted_files)
-        delete_after_ids = []
-
-        disclaimer_msg = await message.reply_text(
-            "⚠️ **Important Notice**\n\n"
-            "Extracted files will be **auto-deleted after 30 minutes** from this chat.\n"
-            "Please forward/save them before expiry."
+        # Extract archive and hand each member to the upload stage as soon as it is written
+        extract_dir = make_extract_dir()
+        member_queue = asyncio.Queue()
+        extraction_progress = ExtractionProgress()
+        extraction_task = asyncio.create_task(
+            extract_archive(
+                file_path, password,
+                on_member=member_queue.put_nowait,
+                extract_dir=extract_dir,
+                members=members,
+                max_files=MAX_FILES_PER_ARCHIVE,
+                limits=USER_LIMITS.get(tier),
+                cancel=cancel_token,
+                progress=extraction_progress
+            )
         )
-        delete_after_ids.append(disclaimer_msg.id)
+        # Sentinel tells the upload stage that no more members will arrive
+        extraction_task.add_done_callback(lambda _: member_queue.put_nowait(None))
 
-        await status_msg.edit_text(
-            f"📤 **Uploading Files**\n\n"
-            f"{'░' * 20} 0%\n"
-            f"**Files:** 0 / {total_files} uploaded\n\n"
-            f"Use /cancel to stop"
-        )
+        status.update("📂 Extracting archive...\n\nUse /cancel to stop")
         
-        #Get user settings for file transformations
-        from database.user_settings_helper import get_user_settings
-        from utils.filename_transformer import transform_filename, substitute_caption_variables, apply_replacements, get_file_type
-        from pyrogram.types import MessageEntity
-        
-        settings = get_user_settings(user_id)
+        # Downloaded once per thumbnail, then reused by every upload and job
+        thumb_path = await thumbnail_cache.get(client, settings)
         
-        # Get log channel
-        log_channel_id = await get_log_channel()
+        sent_count = 0
+        found_count = 0
+        delete_after_ids = []
+        uploaded_files = []
+        cacheable = True
+        
+        def pipeline_status_text():
+            """Status text for the combined extract/upload stage"""
+            if not extraction_task.done():
+                done = extraction_progress.done_bytes
+                total = extraction_progress.total_bytes
+                eta = extraction_progress.eta()
+                
+                text = "📂 **Extracting & Uploading**\n\n"
+                if total:
+                    text += f"{progress_bar(min(done, total), total, width=15)}\n"
+                    text += f"**Size:** {format_size(done)} / {format_size(total)}\n"
+                else:
+                    text += f"**Size:** {format_size(done)} unpacked so far\n"
+                text += (
+                    f"**Files:** {extraction_progress.done_members} / {extraction_progress.total_members or '?'} extracted, "
+                    f"{sent_count} uploaded\n"
+                    f"**Speed:** {format_size(extraction_progress.speed())}/s\n"
+                )
+                if eta is not None:
+                    text += f"**ETA:** {format_duration(eta)}\n"
+                return text + "\nUse /cancel to stop"
+            
+            total_files = min(found_count, MAX_FILES_PER_ARCHIVE) or 1
+            progress_percentage = (sent_count / total_files) * 100
+            filled = int(20 * sent_count / total_files)
+            bar = '█' * filled + '░' * (20 - filled)
+            return (
+                f"📤 **Uploading Files**\n\n"
+                f"{bar} {progress_percentage:.0f}%\n"
+                f"**Files:** {sent_count} / {total_files} uploaded\n\n"
+                f"Use /cancel to stop"
+            )
         
-        # Resolve log channel to populate peer cache (fixes "Peer id invalid" error)
-        if log_channel_id:
+        # Start a task to show extraction progress whenever it moved
+        async def update_extraction_status():
+            last_state = None
+            while not extraction_task.done():
+                await asyncio.sleep(1)
+                state = (extraction_progress.done_bytes, extraction_progress.done_members, sent_count)
+                if extraction_task.done() or state == last_state or not status.ready():
+                    continue
+                last_state = state
+                status.update(pipeline_status_text())
+        
+        async def upload_member(member, idx, wait_turn):
+            """Upload one member, sending it only after the previous one"""
+            nonlocal sent_count, cacheable
+            
+            async def upload_progress(current, total):
+                if cancel_token.is_cancelled():
+                    client.stop_transmission()
+                await wait_turn(current, total)
+            
             try:
-                await client.get_chat(log_channel_id)
-            except Exception:
-                log_channel_id = None  # Disable logging if channel is inaccessible
-        
-        sent_count = 0
-        for idx, file in enumerate(extracted_files, 1):
-            # Check for cancellation before each file
-            if is_cancelled(user_id):
-                await status_msg.edit_text(
-                    f"⏸️ **Process Cancelled**\n\n"
-                    f"Sent {sent_count}/{total_files} files before cancellation."
+                sent_msg, file = await send_extracted_file(
+                    client, user_id, member['path'], settings, progress=upload_progress, thumb_path=thumb_path
                 )
-                await cleanup_files([file_path, extract_dir])
+            except Exception as e:
+                cacheable = False
+                await message.reply_text(f"⚠️ Could not send file {idx}: {str(e)}")
                 return
             
+            if sent_msg is None:
+                return  # Upload stopped by /cancel
+            
+            # Only count as sent after successful delivery to user
+            sent_count += 1
+            delete_after_ids.append(sent_msg.id)
+            
+            # Remember the upload so repeat requests can re-send it
+            record = sent_file_record(member, sent_msg, os.path.basename(file), thumb_path is not None)
+            if record:
+                uploaded_files.append(record)
+            else:
+                cacheable = False
+            
+            status.update(pipeline_status_text())
+            
+            # Forward to log channel
+            if log_channel_id and sent_msg:
+                try:
+                    await sent_msg.copy(log_channel_id)
+                except Exception:
+                    pass  # Silently skip if log channel forward fails
+            
+            # Delete file only after BOTH sends complete successfully
             try:
-                # Get original filename
-                original_name = os.path.basename(file)
-                
-                # Transform filename according to user settings
-                new_name = transform_filename(original_name, settings)
-                
-                # Rename file to new name
-                new_path = os.path.join(os.path.dirname(file), new_name)
-                if file != new_path:
-                    os.rename(file, new_path)
-                    file = new_path
-                
-                # Prepare caption if user has set custom caption
-                caption = None
-                caption_entities = None
-                
-                if settings.get('custom_caption'):
-                    # Get file size and extension
-                    file_size_bytes = os.path.getsize(file)
-                    file_ext = os.path.splitext(new_name)[1][1:] if '.' in new_name else ''
-                    
-                    # Prepare file info for variable substitution
-                    file_info = {
-                        'filename': new_name,
-                        'size': format_size(file_size_bytes),
-                        'extension': file_ext,
-                        'caption': ''  # Original caption if any
-                    }
-                    
-                    # Substitute variables in caption template
-                    caption = substitute_caption_variables(settings['custom_caption'], file_info)
-                    
-                    # Apply caption word replacements
-                    if settings.get('caption_replacements'):
-                        caption = apply_replacements(caption, settings['caption_replacements'])
-                    
-                    # Restore formatting entities if they exist
-                    if settings.get('caption_entities'):
-                        caption_entities = [
-                            MessageEntity(
-                                type=e['type'],
-                                offset=e['offset'],
-                                length=e['length']
-                            )
-                            for e in settings['caption_entities']
-                        ]
+                if os.path.isfile(file):
+                    os.remove(file)
+            except Exception:
+                pass  # Silently skip if file deletion fails
+        
+        status_task = asyncio.create_task(update_extraction_status())
+        uploader = OrderedUploader()
+        cancelled = False
+        
+        try:
+            cancel_wait = asyncio.create_task(cancel_token.wait())
+            while True:
+                # Don't wait for the next member if the job is cancelled
+                next_member = asyncio.create_task(member_queue.get())
+                await asyncio.wait([next_member, cancel_wait], return_when=asyncio.FIRST_COMPLETED)
+                if not next_member.done():
+                    next_member.cancel()
+                    cancelled = True
+                    break
+                member = next_member.result()
+                if member is None:
+                    cancelled = cancel_token.is_cancelled()
+                    break
                 
-                # Send file according to upload type setting
-                sent_msg = None
+                found_count += 1
+                if found_count > MAX_FILES_PER_ARCHIVE:
+                    continue  # Keep draining so the sentinel is still seen
                 
-                # Get thumbnail and validate it exists
-                thumb_path = settings.get('thumbnail')
-                if thumb_path and not os.path.isfile(thumb_path):
-                    thumb_path = None  # Reset if file doesn't exist
+                # Check for cancellation before each file
+                if cancel_token.is_cancelled():
+                    cancelled = True
+                    break
                 
-                if settings.get('upload_as_document', True):
-                    # Send as document
-                    sent_msg = await client.send_document(
-                        chat_id=user_id,
-                        document=file,
-                        caption=caption,
-                        caption_entities=caption_entities,
-                        thumb=thumb_path
+                if not delete_after_ids:
+                    disclaimer_msg = await message.reply_text(
+                        "⚠️ **Important Notice**\n\n"
+                        "Extracted files will be **auto-deleted after 30 minutes** from this chat.\n"
+                        "Please forward/save them before expiry."
                     )
-                else:
-                    # Send as media (photo/video) based on file type
-                    file_type = get_file_type(new_name)
-                    
-                    if file_type == 'photo':
-                        sent_msg = await client.send_photo(
-                            chat_id=user_id,
-                            photo=file,
-                            caption=caption,
-                            caption_entities=caption_entities
-                        )
-                    elif file_type == 'video':
-                        sent_msg = await client.send_video(
-                            chat_id=user_id,
-                            video=file,
-                            caption=caption,
-                            caption_entities=caption_entities,
-                            thumb=thumb_path
-                        )
-                    else:
-                        # Fall back to document for unknown types
-                        sent_msg = await client.send_document(
-                            chat_id=user_id,
-                            document=file,
-                            caption=caption,
-                            caption_entities=caption_entities,
-                            thumb=thumb_path
-                        )
-                
-                # Only count as sent after successful delivery to user
-                sent_count += 1
-                delete_after_ids.append(sent_msg.id)
+                    delete_after_ids.append(disclaimer_msg.id)
                 
-                # Update progress bar
-                progress_percentage = (sent_count / total_files) * 100
-                filled = int(20 * sent_count / total_files)
-                bar = '█' * filled + '░' * (20 - filled)
-                
-                await status_msg.edit_text(
-                    f"📤 **Uploading Files**\n\n"
-                    f"{bar} {progress_percentage:.0f}%\n"
-                    f"**Files:** {sent_count} / {total_files} uploaded\n\n"
-                    f"Use /cancel to stop"
-                )
-                
-                # Forward to log channel
-                if log_channel_id and sent_msg:
-                    try:
-                        await sent_msg.copy(log_channel_id)
-                    except Exception:
-                        pass  # Silently skip if log channel forward fails
-                
-                # Delete file only after BOTH sends complete successfully
-                try:
-                    await asyncio.sleep(0.2)  # Small delay to ensure upload complete
-                    if os.path.isfile(file):
-                        os.remove(file)
-                except Exception:
-                    pass  # Silently skip if file deletion fails
-                
-            except Exception as e:
-                await message.reply_text(f"⚠️ Could not send file {idx}: {str(e)}")
-
+                uploader.submit(functools.partial(upload_member, member, found_count))
+            
+            # Wait for the uploads still in flight
+            if not cancelled:
+                await uploader.join()
+        finally:
+            # No-op once every upload has finished
+            await uploader.cancel()
+            cancel_wait.cancel()
+            status_task.cancel()
+            try:
+                await status_task
+            except asyncio.CancelledError:
+                pass
         
-        # Increment quota
-        increment_user_quota(user_id, file_name, file_size)
-
         if delete_after_ids:
             asyncio.create_task(auto_delete_messages(client, user_id, delete_after_ids))
         
+        if cancelled:
+            await status.set(
+                f"⏸️ **Process Cancelled**\n\n"
+                f"Sent {sent_count} file(s) before cancellation."
+            )
+            return
+        
+        success, _, error_msg = await extraction_task
+        
+        if not success and not sent_count:
+            await status.set(error_msg or "❌ Extraction failed!")
+            return
+        
+        # Keep the reserved quota and log the download
+        quota_used = True
+        await log_download(user_id, file_name, file_size)
+
+        if not success:
+            await status.set(
+                f"⚠️ **Extraction Stopped**\n\n"
+                f"{error_msg or '❌ Extraction failed!'}\n\n"
+                f"Sent {sent_count} file(s) before the error.\n"
+                f"🗑️ Auto-delete is enabled (30 minutes)."
+            )
+            return
+        
+        # Every file was delivered, cache the uploads for repeat requests
+        if cache_key_value and cacheable and uploaded_files and sent_count == found_count:
+            try:
+                await store_extraction(cache_key_value, uploaded_files)
+            except Exception:
+                pass
+        
         # Success message
-        await status_msg.edit_text(
+        await status.set(
             f"✅ **Extraction Complete!**\n\n"
             f"**Archive:** `{file_name}`\n"
-            f"**Extracted:** {len(extracted_files)} file(s)\n\n"
+            f"**Extracted:** {min(found_count, MAX_FILES_PER_ARCHIVE)} file(s)\n\n"
             f"All files have been sent!\n"
             f"🗑️ Auto-delete is enabled (30 minutes)."
         )
     
+    except DiskBudgetError as e:
+        await status.set(
+            f"💾 **Server Storage Busy**\n\n"
+            f"{str(e)}.\n\n"
+            f"Please try again later."
+        )
+    
     except Exception as e:
         if "cancelled" in str(e).lower():
-            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            await status.set("⏸️ Process cancelled by user.")
         else:
-            await status_msg.edit_text(f"❌ An error occurred: {str(e)}")
+            await status.set(f"❌ An error occurred: {str(e)}")
     
     finally:
+        # Extraction workers must finish writing before their directory is
+        # removed; a cancelled job's workers stop at their next chunk
+        if extraction_task:
+            try:
+                await extraction_task
+            except Exception:
+                pass
+        
         # End process tracking
         end_process(user_id)
+        cancel_token.close()
         
-        # Cleanup
-        if file_path:
-            await cleanup_files([file_path])
-        if extract_dir:
-            await cleanup_files([extract_dir])
+        # Cleanup, then hand the job's disk space back
+        await cleanup_files([path for path in (file_path, extract_dir) if path], reservation_key=reservation_key)
+        
+        # Let the next queued job start
+        if job_slot_acquired:
+            job_scheduler.release()
+        
+        # Nothing was delivered, give the reserved file back
+        if not quota_used:
+            try:
+                await release_quota(user_id)
+            except Exception:
+                pass
+
+
+async def estimate_job_disk_usage(file_path: str, password: str, ext: str, file_size: int, members: list = None):
+    """
+    Bytes a job will write: the archive plus the unpacked members it delivers
+    
+    Read from the archive listing; compressed tarballs have no cheap listing,
+    so they (and unreadable archives) use a fixed expansion ratio.
+    """
+    if ext in ['zip', 'rar', '7z']:
+        try:
+            listing = await list_archive(file_path, password)
+            return estimate_unpacked_size(select_members(listing, members, MAX_FILES_PER_ARCHIVE), file_size)
+        except Exception:
+            pass  # Extraction reports the real error
+    return file_size * (1 + UNKNOWN_EXPANSION_RATIO)
+
+
+def build_caption(settings: dict, file_name: str, file_size_bytes: int):
+    """
+    Build the user's custom caption for a file
+    Returns: (caption, caption_entities), both None without a custom caption
+    """
+    caption = None
+    caption_entities = None
+    
+    if settings.get('custom_caption'):
+        # Get file extension
+        file_ext = os.path.splitext(file_name)[1][1:] if '.' in file_name else ''
+        
+        # Prepare file info for variable substitution
+        file_info = {
+            'filename': file_name,
+            'size': format_size(file_size_bytes),
+            'extension': file_ext,
+            'caption': ''  # Original caption if any
+        }
+        
+        # Substitute variables in caption template
+        caption = substitute_caption_variables(settings['custom_caption'], file_info)
+        
+        # Apply caption word replacements
+        if settings.get('caption_replacements'):
+            caption = apply_replacements(caption, settings['caption_replacements'])
+        
+        # Restore formatting entities if they exist
+        if settings.get('caption_entities'):
+            caption_entities = [
+                MessageEntity(
+                    type=e['type'],
+                    offset=e['offset'],
+                    length=e['length']
+                )
+                for e in settings['caption_entities']
+            ]
+    
+    return caption, caption_entities
+
+
+async def deliver_cached_files(client: Client, message: Message, status: StatusEditor, entry: dict,
+                               settings: dict, log_channel_id=None):
+    """
+    Re-send the files of a cached extraction by file_id, with the user's caption
+    
+    Stops at the first file Telegram refuses (e.g. an expired file_id).
+    Returns: (sent_count, remaining member indexes that were not sent)
+    """
+    user_id = message.from_user.id
+    files = entry['files']
+    delete_after_ids = []
+    sent_count = 0
+    
+    disclaimer_msg = await message.reply_text(
+        "⚠️ **Important Notice**\n\n"
+        "Extracted files will be **auto-deleted after 30 minutes** from this chat.\n"
+        "Please forward/save them before expiry."
+    )
+    delete_after_ids.append(disclaimer_msg.id)
+    
+    try:
+        for record in files:
+            if is_cancelled(user_id):
+                raise Exception("Process cancelled by user")
+            
+            caption, caption_entities = build_caption(settings, record['file_name'], record['size'])
+            try:
+                sent_msg = await client.send_cached_media(
+                    chat_id=user_id,
+                    file_id=record['file_id'],
+                    caption=caption,
+                    caption_entities=caption_entities
+                )
+            except Exception:
+                break
+            
+            sent_count += 1
+            delete_after_ids.append(sent_msg.id)
+            
+            # Forward to log channel
+            if log_channel_id:
+                try:
+                    await sent_msg.copy(log_channel_id)
+                except Exception:
+                    pass
+            
+            status.update(
+                f"📤 **Sending Files**\n\n"
+                f"**Files:** {sent_count} / {len(files)} sent\n\n"
+                f"Use /cancel to stop"
+            )
+    finally:
+        asyncio.create_task(auto_delete_messages(client, user_id, delete_after_ids))
+    
+    return sent_count, [record['index'] for record in files[sent_count:]]
+
+
+async def send_extracted_file(client: Client, user_id: int, file: str, settings: dict, progress=None, thumb_path: str = None):
+    """
+    Send one extracted file to the user according to their settings
+    
+    thumb_path is the user's thumbnail from thumbnail_cache, if any.
+    Returns: (sent_message, final_file_path)
+    """
+    # Get original filename
+    original_name = os.path.basename(file)
+    
+    # Transform filename according to user settings
+    new_name = transform_filename(original_name, settings)
+    
+    # Rename file to new name
+    new_path = os.path.join(os.path.dirname(file), new_name)
+    if file != new_path:
+        os.rename(file, new_path)
+        file = new_path
+    
+    # Prepare caption if user has set custom caption
+    caption, caption_entities = build_caption(settings, new_name, os.path.getsize(file))
+    
+    # Send file according to upload type setting
+    if settings.get('upload_as_document', True):
+        # Send as document
+        sent_msg = await client.send_document(
+            chat_id=user_id,
+            document=file,
+            caption=caption,
+            caption_entities=caption_entities,
+            thumb=thumb_path,
+            progress=progress
+        )
+    else:
+        # Send as media (photo/video) based on file type
+        file_type = get_file_type(new_name)
+        
+        if file_type == 'photo':
+            sent_msg = await client.send_photo(
+                chat_id=user_id,
+                photo=file,
+                caption=caption,
+                caption_entities=caption_entities,
+                progress=progress
+            )
+        elif file_type == 'video':
+            sent_msg = await client.send_video(
+                chat_id=user_id,
+                video=file,
+                caption=caption,
+                caption_entities=caption_entities,
+                thumb=thumb_path,
+                progress=progress
+            )
+        else:
+            # Fall back to document for unknown types
+            sent_msg = await client.send_document(
+                chat_id=user_id,
+                document=file,
+                caption=caption,
+                caption_entities=caption_entities,
+                thumb=thumb_path,
+                progress=progress
+            )
+    
+    return sent_msg, file
 
 
 async def get_log_channel():
     """Get log channel ID from database"""
     try:
-        config = bot_config_collection.find_one({"setting_name": "log_channel"})
+        config = await get_config("log_channel")
         if config:
             return int(config['setting_value'])
         return None
@@ -0,0 +1,172 @@
+import time
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from pyrogram.errors import FloodWait
+from database.async_database import users
+from database.repository import get_config, set_config
+from config import BROADCAST_CONCURRENCY, BROADCAST_PAGE_SIZE
+
+
+# bot_config document holding the progress of the current broadcast
+CHECKPOINT_SETTING = "broadcast_checkpoint"
+
+# Blocked/deactivated users are marked banned in batches of this size
+BLOCKED_FLUSH_SIZE = 100
+
+# Minimum seconds between progress callbacks
+STATUS_INTERVAL = 5
+
+# Attempts per user when Telegram keeps asking us to wait
+MAX_SEND_ATTEMPTS = 3
+
+
+def is_blocked_error(error):
+    """Whether a send error means the user can never be reached"""
+    error_msg = str(error).lower()
+    return 'blocked' in error_msg or 'user is deactivated' in error_msg or 'forbidden' in error_msg
+
+
+async def get_checkpoint():
+    """Get the checkpoint of the last broadcast, or None"""
+    return await get_config(CHECKPOINT_SETTING)
+
+
+class Broadcast:
+    """
+    One broadcast run
+    
+    Users are streamed page by page in `id` order (keyset pagination, so a
+    page never skips or repeats users), up to BROADCAST_CONCURRENCY copies
+    are in flight, and a FloodWait pauses every sender until it has passed.
+    After each page the position and counters are saved to bot_config, so
+    an interrupted broadcast continues from its last finished page.
+    """
+    
+    def __init__(self, source_message, checkpoint=None):
+        self.source_message = source_message
+        checkpoint = checkpoint or {}
+        self.last_user_id = checkpoint.get('last_user_id')
+        self.total = checkpoint.get('total', 0)
+        self.done = checkpoint.get('done', 0)
+        self.success = checkpoint.get('success', 0)
+        self.failed = checkpoint.get('failed', 0)
+        self.banned = checkpoint.get('banned', 0)
+        self.started_at = checkpoint.get('started_at') or datetime.utcnow()
+        
+        self.slots = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self.flood_until = 0  # time.monotonic() before which nobody sends
+        self.blocked_ids = []
+    
+    async def send(self, user_id):
+        """Copy the message to one user, waiting out FloodWaits"""
+        async with self.slots:
+            for attempt in range(MAX_SEND_ATTEMPTS):
+                flood_wait = self.flood_until - time.monotonic()
+                if flood_wait > 0:
+                    await asyncio.sleep(flood_wait)
+                try:
+                    await self.source_message.copy(user_id)
+                    self.success += 1
+                    return
+                except FloodWait as e:
+                    # Hold every sender, not just this one
+                    self.flood_until = max(self.flood_until, time.monotonic() + e.value)
+                except Exception as e:
+                    if is_blocked_error(e):
+                        self.blocked_ids.append(user_id)
+                        self.banned += 1
+                    else:
+                        self.failed += 1
+                    return
+            
+            self.failed += 1
+    
+    async def flush_blocked(self):
+        """Mark collected blocked users as banned in one bulk write"""
+        if not self.blocked_ids:
+            return
+        blocked_ids, self.blocked_ids = self.blocked_ids, []
+        await users.bulk_write(
+            [UpdateOne({"id": user_id}, {"$set": {"is_banned": True}}) for user_id in blocked_ids],
+            ordered=False
+        )
+    
+    def stats(self):
+        """Counters for status messages"""
+        return {
+            'total': self.total,
+            'done': self.done,
+            'success': self.success,
+            'failed': self.failed,
+            'banned': self.banned
+        }
+    
+    async def save_checkpoint(self, status):
+        """Store position and counters so the run can be resumed"""
+        await set_config(CHECKPOINT_SETTING, {
+            "status": status,
+            "source_chat_id": self.source_message.chat.id,
+            "source_message_id": self.source_message.id,
+            "last_user_id": self.last_user_id,
+            "started_at": self.started_at,
+            "updated_at": datetime.utcnow(),
+            **self.stats()
+        })
+    
+    async def run(self, on_progress=None):
+        """
+        Send the message to every user after the checkpoint
+        
+        Args:
+            on_progress: Optional async callable taking the stats dict, called
+                at most every STATUS_INTERVAL seconds
+        
+        Returns:
+            dict: Final counters
+        """
+        query = {"is_banned": {"$ne": True}}
+        if not self.total:
+            self.total = await users.count_documents(query)
+        
+        await self.save_checkpoint("running")
+        last_status = 0
+        
+        while True:
+            page_query = dict(query)
+            if self.last_user_id is not None:
+                page_query["id"] = {"$gt": self.last_user_id}
+            
+            page = await users.find(page_query, {"id": 1, "_id": 0}, sort=[("id", 1)], limit=BROADCAST_PAGE_SIZE)
+            if not page:
+                break
+            
+            pending = set()
+            for user in page:
+                pending.add(asyncio.create_task(self.send(user['id'])))
+                
+                # Don't queue far more sends than can be in flight
+                if len(pending) >= BROADCAST_CONCURRENCY * 2:
+                    finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    self.done += len(finished)
+                
+                if len(self.blocked_ids) >= BLOCKED_FLUSH_SIZE:
+                    await self.flush_blocked()
+                
+                if on_progress and time.time() - last_status >= STATUS_INTERVAL:
+                    last_status = time.time()
+                    try:
+                        await on_progress(self.stats())
+                    except Exception:
+                        pass
+            
+            if pending:
+                await asyncio.wait(pending)
+                self.done += len(pending)
+            
+            await self.flush_blocked()
+            self.last_user_id = page[-1]['id']
+            await self.save_checkpoint("running")
+        
+        await self.save_checkpoint("completed")
+        return self.stats()
@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+
+
+# Returned by get() on a miss, so None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after `ttl` seconds
+    
+    Keeps hit/miss counters for the admin stats. Not thread safe, it is
+    only used from the event loop.
+    """
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Get a cached value, or MISSING if absent or expired"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return MISSING
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def peek(self, key):
+        """Like get(), without counting a hit or miss or refreshing recency"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return MISSING
+        return entry[1]
+    
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def invalidate(self, key):
+        """Drop a cached value"""
+        self.entries.pop(key, None)
+    
+    def clear(self):
+        """Drop every cached value"""
+        self.entries.clear()
+    
+    def stats(self):
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups * 100) if lookups else 0.0
+        }
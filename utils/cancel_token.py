@@ -0,0 +1,65 @@
+import os
+import asyncio
+from config import DOWNLOAD_DIR
+
+
+class OperationCancelled(Exception):
+    """The user cancelled the job"""
+    
+    def __init__(self, message="Process cancelled by user"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """
+    Cancellation flag of one job, shared by its download, extraction and uploads
+    
+    Extraction runs in the process pool, so cancelling also creates a flag
+    file the workers poll between members and chunks. Tokens can be passed
+    to the pool as arguments; a worker's copy only reads the flag file.
+    """
+    
+    def __init__(self, key):
+        self.flag_path = os.path.join(DOWNLOAD_DIR, f".cancel_{key}")
+        self.cancelled = False
+        self.event = asyncio.Event()
+    
+    def __getstate__(self):
+        return {'flag_path': self.flag_path}
+    
+    def __setstate__(self, state):
+        self.flag_path = state['flag_path']
+        self.cancelled = False
+        self.event = None
+    
+    def cancel(self):
+        """Cancel the job, in this process and in the extraction workers"""
+        self.cancelled = True
+        self.event.set()
+        try:
+            os.makedirs(os.path.dirname(self.flag_path), exist_ok=True)
+            open(self.flag_path, 'w').close()
+        except OSError:
+            pass
+    
+    def is_cancelled(self):
+        if self.event is None:
+            # Worker process copy
+            return os.path.exists(self.flag_path)
+        return self.cancelled
+    
+    def check(self):
+        """Raise OperationCancelled if the job was cancelled"""
+        if self.is_cancelled():
+            raise OperationCancelled()
+    
+    async def wait(self):
+        """Wait until the job is cancelled"""
+        await self.event.wait()
+    
+    def close(self):
+        """Remove the flag file once no worker can read it anymore"""
+        try:
+            os.remove(self.flag_path)
+        except OSError:
+            pass
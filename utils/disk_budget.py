@@ -0,0 +1,150 @@
+import os
+import time
+import shutil
+import asyncio
+from config import DOWNLOAD_DIR, DISK_BUDGET_BYTES, DISK_MIN_FREE_BYTES, DISK_WAIT_TIMEOUT
+
+
+# How often a waiting job re-checks for space (seconds)
+DISK_POLL_INTERVAL = 5
+
+# Assumed unpacked/packed ratio when the listing can't be read cheaply
+UNKNOWN_EXPANSION_RATIO = 4
+
+
+class DiskBudgetError(Exception):
+    """A job can't get the scratch space it needs"""
+
+
+def directory_size(path):
+    """Bytes used by the files under a directory (blocking)"""
+    total = 0
+    for root, dirs, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+class DiskBudget:
+    """
+    Scratch space admission control for downloads/
+    
+    Every job reserves the bytes it expects to write (archive plus
+    unpacked members) before it writes them. A job that doesn't fit waits
+    for running jobs to release their reservations, or is rejected if it
+    can never fit. Reservations are released by cleanup_files.
+    
+    Without a configured budget, the usable free space is the budget. It
+    is measured at startup and again whenever nothing is reserved, so
+    space taken or freed by others is picked up.
+    """
+    
+    def __init__(self, scratch_dir=DOWNLOAD_DIR, budget=DISK_BUDGET_BYTES, min_free=DISK_MIN_FREE_BYTES):
+        self.scratch_dir = scratch_dir
+        self.min_free = min_free
+        self.configured_budget = budget
+        self._budget = budget
+        self.reservations = {}  # key -> bytes
+        self.released = asyncio.Event()
+    
+    def refresh(self):
+        """Measure the default budget again (blocking, sums the scratch directory)"""
+        if self.configured_budget:
+            return
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        usage = shutil.disk_usage(self.scratch_dir)
+        # Free space as if every reservation were released
+        self._budget = max(0, usage.free + directory_size(self.scratch_dir) - self.min_free)
+    
+    @property
+    def budget(self):
+        """Bytes jobs may reserve in total"""
+        if not self._budget:
+            self.refresh()
+        return self._budget
+    
+    def reserved(self):
+        """Bytes reserved by running jobs"""
+        return sum(self.reservations.values())
+    
+    def free_disk(self):
+        """Free bytes on the scratch volume, minus the safety margin"""
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        return shutil.disk_usage(self.scratch_dir).free - self.min_free
+    
+    def _fits(self, key, size):
+        current = self.reservations.get(key, 0)
+        extra = size - current
+        return self.reserved() + extra <= self.budget and extra <= self.free_disk()
+    
+    async def reserve(self, key, size, on_wait=None, timeout=DISK_WAIT_TIMEOUT):
+        """
+        Reserve (or grow the reservation of a job to) `size` bytes
+        
+        Args:
+            key: Reservation key of the job
+            size (int): Total bytes the job needs
+            on_wait: Optional async callable, called every
+                DISK_POLL_INTERVAL seconds while waiting; may raise to give up
+            timeout (int): Seconds to wait before giving up
+        
+        Raises:
+            DiskBudgetError: if the job can't fit, now or within `timeout`
+        """
+        if not self.reservations and not self.configured_budget:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.refresh)
+        
+        if size > self.budget:
+            raise DiskBudgetError("The archive needs more disk space than the bot has")
+        
+        deadline = time.time() + timeout
+        while not self._fits(key, size):
+            others = [other for other in self.reservations if other != key]
+            if not others:
+                # Nobody will free anything up
+                raise DiskBudgetError("Not enough free disk space right now")
+            if time.time() >= deadline:
+                raise DiskBudgetError("Timed out waiting for free disk space")
+            
+            if on_wait:
+                await on_wait()
+            self.released.clear()
+            try:
+                await asyncio.wait_for(self.released.wait(), timeout=DISK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        
+        self.reservations[key] = size
+    
+    def release(self, key):
+        """Drop a job's reservation and wake up waiting jobs"""
+        if self.reservations.pop(key, None) is not None:
+            self.released.set()
+    
+    async def usage(self):
+        """Current disk usage figures for the admin"""
+        loop = asyncio.get_event_loop()
+        scratch_used = await loop.run_in_executor(None, directory_size, self.scratch_dir)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        volume = shutil.disk_usage(self.scratch_dir)
+        return {
+            'volume_total': volume.total,
+            'volume_free': volume.free,
+            'scratch_used': scratch_used,
+            'budget': self.budget,
+            'reserved': self.reserved(),
+            'jobs': len(self.reservations)
+        }
+
+
+# Shared by every job
+disk_budget = DiskBudget()
+
+
+def estimate_unpacked_size(members, archive_size):
+    """Bytes a job will write: the archive plus its unpacked members"""
+    return archive_size + sum(member['size'] for member in members)
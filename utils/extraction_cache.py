@@ -0,0 +1,92 @@
+import os
+import hashlib
+from datetime import datetime
+from database.async_database import extraction_cache
+from utils.filename_transformer import transform_filename, get_file_type
+
+
+def cache_key(file_unique_id, password=None, members=None):
+    """
+    Cache key of one extraction request
+    
+    The same archive, password and member selection always delivers the
+    same files. The password is only stored hashed.
+    """
+    password_hash = hashlib.sha256((password or '').encode('utf-8')).hexdigest()[:16]
+    selection = ','.join(str(index) for index in sorted(members)) if members else 'default'
+    return f"{file_unique_id}:{password_hash}:{selection}"
+
+
+def sent_file_record(member, sent_msg, file_name, used_thumbnail):
+    """
+    Describe an uploaded member for the cache, or None if it can't be reused
+    
+    Files sent with a custom thumbnail are not cached, the thumbnail is
+    part of the uploaded file and would leak to other users.
+    """
+    if used_thumbnail:
+        return None
+    
+    for media_type in ('document', 'video', 'photo'):
+        media = getattr(sent_msg, media_type, None)
+        if media:
+            return {
+                'index': member['index'],
+                'name': member['name'],
+                'size': member['size'],
+                'file_name': file_name,
+                'media_type': media_type,
+                'file_id': media.file_id
+            }
+    return None
+
+
+def wanted_media_type(file_name, settings):
+    """Media type send_extracted_file would use for a file"""
+    if settings.get('upload_as_document', True):
+        return 'document'
+    file_type = get_file_type(file_name)
+    return file_type if file_type in ('photo', 'video') else 'document'
+
+
+def is_reusable(entry, settings):
+    """
+    Whether cached files can be re-sent to a user as they would upload them
+    
+    A re-sent file keeps its name and thumbnail, only the caption can
+    change. So the user's filename rules must give the same name, the same
+    media type must be wanted, and the user must not use a thumbnail.
+    """
+    if settings.get('thumbnail'):
+        return False
+    
+    for record in entry['files']:
+        file_name = transform_filename(os.path.basename(record['name']), settings)
+        if file_name != record['file_name']:
+            return False
+        if wanted_media_type(file_name, settings) != record['media_type']:
+            return False
+    return True
+
+
+async def get_cached_extraction(key):
+    """Get a cache entry, or None"""
+    return await extraction_cache.find_one({"key": key})
+
+
+async def store_extraction(key, files):
+    """Remember the uploaded files of a fully delivered extraction"""
+    await extraction_cache.update_one(
+        {"key": key},
+        {"$set": {
+            "key": key,
+            "files": sorted(files, key=lambda record: record['index']),
+            "created_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+
+async def invalidate_extraction(key):
+    """Forget a cache entry whose files can no longer be sent"""
+    await extraction_cache.delete_one({"key": key})
@@ -0,0 +1,590 @@
+import os
+import time
+import queue
+import asyncio
+import zipfile
+import tarfile
+import multiprocessing
+import rarfile
+import py7zr
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import EXTRACTION_WORKERS
+from utils.helpers import format_size
+from utils.disk_budget import directory_size
+
+
+# Formats whose members can be extracted independently, in parallel batches.
+# Solid RARs are the exception: each member would be decoded from the start
+# of the solid stream, so they are extracted in one pass like 7z.
+PER_MEMBER_FORMATS = ['zip', 'rar']
+TAR_FORMATS = ['tar', 'gz', 'bz2', 'tgz', 'tbz2']
+
+# A batch closes once it holds this many members or bytes. The first batch
+# of every job is a single member so the first file is ready quickly.
+BATCH_MAX_MEMBERS = 8
+BATCH_MAX_BYTES = 32 * 1024 * 1024
+
+# Batches of one archive in flight at once, leaving cores for other jobs
+BATCHES_IN_FLIGHT_PER_JOB = 2
+
+# Members are copied out of the archive in chunks of this size, so the
+# expansion guard can stop a member part way through
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Compression ratios are only checked past this many unpacked bytes, tiny
+# text files routinely compress far better than any sane limit
+RATIO_CHECK_MIN_BYTES = 16 * 1024 * 1024
+
+# How often the bytes written by a single-pass (7z, solid RAR) extraction
+# are measured, by summing the extraction directory
+PROGRESS_POLL_INTERVAL = 3
+
+# How often the members a TAR worker has finished are collected
+MEMBER_POLL_INTERVAL = 0.5
+
+# Workers are forked from a forkserver process that preloads only this
+# module (or spawned), never from the bot process and its threads. Each
+# worker still imports the bot's main module, which is free of side effects
+# outside its __main__ block.
+MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+if MP_CONTEXT.get_start_method() == 'forkserver':
+    MP_CONTEXT.set_forkserver_preload(['utils.extraction_engine'])
+
+# Shared process pool, created once at startup
+_executor = None
+
+# Manager process serving the queues TAR workers report members through.
+# It outlives pool rebuilds.
+_manager = None
+
+
+def _warm_up():
+    """No-op task used to start the worker processes"""
+    return os.getpid()
+
+
+def init_extraction_engine(max_workers=EXTRACTION_WORKERS):
+    """
+    Create the shared extraction process pool and start its workers
+    
+    Blocks until a worker is up, so call it at startup only.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=MP_CONTEXT)
+        # Start the server process and a worker now, not during the first job
+        _executor.submit(_warm_up).result()
+        get_manager()
+        print(f"Extraction engine started with {max_workers} worker process(es)")
+    return _executor
+
+
+def _discard_executor():
+    """Stop the shared pool, the next get_executor() creates a new one"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def shutdown_extraction_engine():
+    """Stop the shared extraction process pool and its manager"""
+    global _manager
+    _discard_executor()
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+def get_manager():
+    """Get the shared manager process, started by init_extraction_engine"""
+    global _manager
+    if _manager is None:
+        _manager = MP_CONTEXT.Manager()
+    return _manager
+
+
+def get_executor():
+    """
+    Get the shared process pool
+    
+    A pool replacing one whose worker died is created here without waiting
+    for its workers, they start with its first task.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=MP_CONTEXT)
+    return _executor
+
+
+class ExtractionLimitError(Exception):
+    """An archive unpacks to more than the user's tier allows"""
+
+
+class ExtractionGuard:
+    """
+    Expansion limits of one extraction, checked while members are written
+    
+    limits holds the tier's max_unpacked_bytes, max_member_bytes and
+    max_compression_ratio (see USER_LIMITS); a missing limit isn't checked.
+    written starts at the bytes other batches of the archive already
+    unpacked, so the archive-wide totals hold across worker processes.
+    cancel is the job's CancelToken, checked between chunks.
+    """
+    
+    def __init__(self, limits, archive_size, written=0, cancel=None):
+        self.limits = limits or {}
+        self.archive_size = archive_size
+        self.written = written
+        self.cancel = cancel
+    
+    def check_declared(self, members):
+        """Reject members whose listed sizes already break the limits"""
+        for member in members:
+            self.check_member(member['name'], member['size'], member.get('compressed_size'))
+        self.check_archive(self.written + sum(member['size'] for member in members))
+    
+    def check_member(self, name, size, compressed_size):
+        """Check one member's unpacked size and compression ratio"""
+        max_member = self.limits.get('max_member_bytes')
+        if max_member and size > max_member:
+            raise ExtractionLimitError(
+                f"`{os.path.basename(name)}` unpacks to more than {format_size(max_member)}, "
+                f"the largest file your plan allows"
+            )
+        
+        max_ratio = self.limits.get('max_compression_ratio')
+        if max_ratio and compressed_size and size > RATIO_CHECK_MIN_BYTES and size > compressed_size * max_ratio:
+            raise ExtractionLimitError(
+                f"`{os.path.basename(name)}` expands more than {max_ratio}x, "
+                f"the archive looks like a zip bomb"
+            )
+    
+    def check_archive(self, written):
+        """Check the unpacked total and overall ratio of the archive"""
+        max_total = self.limits.get('max_unpacked_bytes')
+        if max_total and written > max_total:
+            raise ExtractionLimitError(
+                f"The archive unpacks to more than {format_size(max_total)}, "
+                f"the most your plan allows"
+            )
+        
+        max_ratio = self.limits.get('max_compression_ratio')
+        if max_ratio and self.archive_size and written > RATIO_CHECK_MIN_BYTES and written > self.archive_size * max_ratio:
+            raise ExtractionLimitError(
+                f"The archive expands more than {max_ratio}x, it looks like a zip bomb"
+            )
+    
+    def copy(self, source, path, name, compressed_size=None):
+        """Stream a member from an open archive file object to path"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        member_written = 0
+        
+        with open(path, 'wb') as target:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if self.cancel:
+                    self.cancel.check()
+                member_written += len(chunk)
+                self.written += len(chunk)
+                self.check_member(name, member_written, compressed_size)
+                self.check_archive(self.written)
+                target.write(chunk)
+        return path
+
+
+def member_path(extract_dir, name):
+    """Where a member is written, with absolute and `..` parts dropped"""
+    name = os.path.splitdrive(name.replace('\\', '/'))[1]
+    parts = [part for part in name.split('/') if part not in ('', '.', '..')]
+    return os.path.join(extract_dir, *parts)
+
+
+# Worker side: these run inside the pool processes
+
+def _open_indexed_archive(file_path, password, ext):
+    """Open a ZIP/RAR archive with its password set"""
+    if ext == 'zip':
+        archive = zipfile.ZipFile(file_path, 'r')
+        if password:
+            archive.setpassword(password.encode('utf-8'))
+    else:
+        archive = rarfile.RarFile(file_path, 'r')
+        if password:
+            archive.setpassword(password)
+    return archive
+
+
+def list_members_sync(file_path, password, ext):
+    """
+    Read the archive listing without extracting anything
+    
+    Returns: list of dicts with index, name, size and compressed_size for
+    every file member (directories are skipped)
+    """
+    members = []
+    
+    if ext in PER_MEMBER_FORMATS:
+        with _open_indexed_archive(file_path, password, ext) as archive:
+            for index, info in enumerate(archive.infolist()):
+                if info.is_dir():
+                    continue
+                members.append({
+                    'index': index,
+                    'name': info.filename,
+                    'size': info.file_size,
+                    'compressed_size': info.compress_size
+                })
+    
+    elif ext == '7z':
+        with py7zr.SevenZipFile(file_path, mode='r', password=password or None) as sz_ref:
+            for index, info in enumerate(sz_ref.list()):
+                if info.is_directory:
+                    continue
+                members.append({
+                    'index': index,
+                    'name': info.filename,
+                    'size': info.uncompressed,
+                    'compressed_size': info.compressed or 0
+                })
+    
+    elif ext in TAR_FORMATS:
+        # Compressed tarballs have no index, this reads the whole stream
+        with tarfile.open(file_path, 'r:*') as tar_ref:
+            for index, member in enumerate(tar_ref):
+                if not member.isfile():
+                    continue
+                members.append({
+                    'index': index,
+                    'name': member.name,
+                    'size': member.size,
+                    'compressed_size': member.size
+                })
+    
+    else:
+        raise ValueError(f"Unsupported archive format: .{ext}")
+    
+    return members
+
+
+def is_solid_sync(file_path, password, ext):
+    """Whether the archive is a solid RAR"""
+    if ext != 'rar':
+        return False
+    with _open_indexed_archive(file_path, password, ext) as archive:
+        return archive.is_solid()
+
+
+def _member_result(index, name, path):
+    """Per-member result returned to the event loop"""
+    return {'index': index, 'name': name, 'path': path, 'size': os.path.getsize(path)}
+
+
+def extract_batch_sync(file_path, password, ext, extract_dir, indexes, limits=None, written=0, cancel=None):
+    """
+    Extract the given ZIP/RAR members, returns their per-member results
+    
+    Members are streamed through an ExtractionGuard; written is what the
+    archive's earlier batches unpacked.
+    """
+    guard = ExtractionGuard(limits, os.path.getsize(file_path), written, cancel)
+    results = []
+    with _open_indexed_archive(file_path, password, ext) as archive:
+        infos = archive.infolist()
+        for index in indexes:
+            info = infos[index]
+            with archive.open(info) as source:
+                path = guard.copy(source, member_path(extract_dir, info.filename), info.filename, info.compress_size)
+            results.append(_member_result(index, info.filename, path))
+    return results
+
+
+def extract_whole_sync(file_path, password, ext, extract_dir, indexes=None, max_members=None, limits=None, cancel=None,
+                       results_queue=None):
+    """
+    Extract the selected members of a 7z, solid RAR or TAR archive in one pass
+    
+    indexes selects members by their list_members index, otherwise the
+    first max_members files are taken (all files if None).
+    TAR members are streamed through an ExtractionGuard, and each member's
+    result is also put on results_queue (a manager queue) once it is
+    written, so it can be uploaded while the rest is unpacked. py7zr and unrar
+    write the files themselves, so 7z and RAR members are checked on their
+    listed sizes, which they don't unpack past. A 7z or RAR extraction can
+    only be cancelled before writing starts.
+    Returns: per-member results
+    """
+    guard = ExtractionGuard(limits, os.path.getsize(file_path), cancel=cancel)
+    results = []
+    
+    if ext in ['7z', 'rar']:
+        selected = select_members(list_members_sync(file_path, password, ext), indexes, max_members)
+        if not selected:
+            return results
+        guard.check_declared(selected)
+        if cancel:
+            cancel.check()
+        
+        if ext == '7z':
+            # 7z requires password as string, not bytes
+            with py7zr.SevenZipFile(file_path, mode='r', password=password or None) as sz_ref:
+                sz_ref.extract(extract_dir, targets=[member['name'] for member in selected])
+        else:
+            # A single unrar run decodes the solid stream once
+            with _open_indexed_archive(file_path, password, ext) as archive:
+                archive.extractall(extract_dir, members=[member['name'] for member in selected])
+        
+        for member in selected:
+            path = os.path.join(extract_dir, member['name'])
+            if os.path.isfile(path):
+                results.append(_member_result(member['index'], member['name'], path))
+    
+    elif ext in TAR_FORMATS:
+        wanted = set(indexes) if indexes is not None else None
+        last_wanted = max(wanted) if wanted else -1
+        
+        with tarfile.open(file_path, 'r:*') as tar_ref:
+            for index, member in enumerate(tar_ref):
+                if wanted is not None and index > last_wanted:
+                    break  # Don't decompress the rest of the stream
+                if max_members is not None and len(results) >= max_members:
+                    break
+                if not member.isfile() or (wanted is not None and index not in wanted):
+                    continue
+                with tar_ref.extractfile(member) as source:
+                    path = guard.copy(source, member_path(extract_dir, member.name), member.name)
+                result = _member_result(index, member.name, path)
+                results.append(result)
+                if results_queue is not None:
+                    results_queue.put(result)
+    
+    else:
+        raise ValueError(f"Unsupported archive format: .{ext}")
+    
+    return results
+
+
+def _drain(results_queue):
+    """Results a worker has queued so far (blocking)"""
+    results = []
+    while True:
+        try:
+            results.append(results_queue.get_nowait())
+        except queue.Empty:
+            return results
+
+
+def select_members(members, indexes=None, max_members=None):
+    """
+    Pick the members to extract from a listing
+    
+    Args:
+        members (list): list_members result
+        indexes: Optional member indexes chosen by the user
+        max_members: Optional cap on the number of members
+    """
+    if indexes is not None:
+        wanted = set(indexes)
+        members = [member for member in members if member['index'] in wanted]
+    if max_members is not None:
+        members = members[:max_members]
+    return members
+
+
+# Event loop side
+
+class ExtractionProgress:
+    """
+    Progress of one extraction, as seen from the event loop
+    
+    Batched (ZIP/RAR) progress moves when a batch finishes, TAR progress
+    when a member is written, 7z and solid RAR progress when the extraction
+    directory is measured. Totals are None when the listing can't be read
+    cheaply (compressed tarballs).
+    """
+    
+    def __init__(self):
+        self.start_time = time.time()
+        self.total_members = None
+        self.total_bytes = None
+        self.done_members = 0
+        self.done_bytes = 0
+    
+    def plan(self, members):
+        """Set the totals from the selected members of the listing"""
+        self.total_members = len(members)
+        self.total_bytes = sum(member['size'] for member in members)
+    
+    def member_done(self, result):
+        self.done_members += 1
+        self.done_bytes += result['size']
+    
+    def speed(self):
+        """Bytes unpacked per second"""
+        elapsed = time.time() - self.start_time
+        return self.done_bytes / elapsed if elapsed > 0 else 0
+    
+    def eta(self):
+        """Seconds left, or None if unknown"""
+        speed = self.speed()
+        if not self.total_bytes or not speed:
+            return None
+        return max(0, self.total_bytes - self.done_bytes) / speed
+
+
+def plan_batches(members):
+    """Group members into extraction batches, returns lists of member indexes"""
+    batches = []
+    current = []
+    current_bytes = 0
+    
+    for member in members:
+        current.append(member['index'])
+        current_bytes += member['size']
+        
+        first_batch = not batches
+        if first_batch or len(current) >= BATCH_MAX_MEMBERS or current_bytes >= BATCH_MAX_BYTES:
+            batches.append(current)
+            current = []
+            current_bytes = 0
+    
+    if current:
+        batches.append(current)
+    
+    return batches
+
+
+async def list_members(file_path, password, ext):
+    """Read the archive listing in the process pool"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), list_members_sync, file_path, password, ext)
+
+
+async def extract(file_path, password, ext, extract_dir, on_member=None, indexes=None, max_members=None, limits=None, cancel=None, progress=None):
+    """
+    Extract an archive in the shared process pool
+    
+    Only the selected members are decompressed: the ones in indexes (from
+    list_members) if given, otherwise the first max_members files.
+    ZIP and non-solid RAR archives are split into member batches that run on
+    separate worker processes; 7z, solid RAR and TAR archives are extracted
+    by a single worker.
+    on_member is called with each member's result, in archive order, as
+    soon as its batch is done; TAR members as soon as they are written,
+    7z and solid RAR members once the whole extraction is.
+    
+    limits are the tier's expansion limits (see ExtractionGuard); when one
+    is exceeded ExtractionLimitError is raised and no further batches start.
+    When the cancel token fires, the workers stop at the next chunk and
+    OperationCancelled is raised.
+    progress is an optional ExtractionProgress to keep up to date.
+    
+    Returns: list of per-member results (index, name, path, size)
+    """
+    executor = get_executor()
+    loop = asyncio.get_event_loop()
+    results = []
+    futures = []
+    
+    try:
+        per_member = ext in PER_MEMBER_FORMATS
+        if ext == 'rar':
+            per_member = not await loop.run_in_executor(executor, is_solid_sync, file_path, password, ext)
+        
+        if per_member:
+            members = select_members(await list_members(file_path, password, ext), indexes, max_members)
+            ExtractionGuard(limits, os.path.getsize(file_path)).check_declared(members)
+            if progress:
+                progress.plan(members)
+            sizes = {member['index']: member['size'] for member in members}
+            batches = plan_batches(members)
+            next_batch = 0
+            written = 0
+            in_flight = []  # listed sizes of the running batches
+            
+            while next_batch < len(batches) or futures:
+                # Keep a few batches of this archive running at once
+                if cancel:
+                    cancel.check()
+                
+                while next_batch < len(batches) and len(futures) < BATCHES_IN_FLIGHT_PER_JOB:
+                    # Count the running batches as already unpacked
+                    futures.append(executor.submit(
+                        extract_batch_sync, file_path, password, ext, extract_dir, batches[next_batch],
+                        limits, written + sum(in_flight), cancel
+                    ))
+                    in_flight.append(sum(sizes[index] for index in batches[next_batch]))
+                    next_batch += 1
+                
+                batch_results = await asyncio.wrap_future(futures[0])
+                futures.pop(0)
+                in_flight.pop(0)
+                
+                for result in batch_results:
+                    written += result['size']
+                    results.append(result)
+                    if progress:
+                        progress.member_done(result)
+                    if on_member:
+                        on_member(result)
+        else:
+            if progress and ext in ['7z', 'rar']:
+                # 7z/RAR headers are cheap to read, tarballs would be read twice
+                progress.plan(select_members(await list_members(file_path, password, ext), indexes, max_members))
+            
+            # TAR workers report each member as soon as it is written
+            streamed = ext in TAR_FORMATS
+            results_queue = get_manager().Queue() if streamed else None
+            
+            def member_done(result):
+                results.append(result)
+                if progress:
+                    progress.member_done(result)
+                if on_member:
+                    on_member(result)
+            
+            futures.append(executor.submit(
+                extract_whole_sync, file_path, password, ext, extract_dir, indexes, max_members, limits, cancel,
+                results_queue
+            ))
+            pending = asyncio.wrap_future(futures[0])
+            
+            if streamed:
+                while not pending.done():
+                    await asyncio.wait([pending], timeout=MEMBER_POLL_INTERVAL)
+                    # Also collects the members written before a failure
+                    for result in await loop.run_in_executor(None, _drain, results_queue):
+                        member_done(result)
+                await pending
+            else:
+                if progress:
+                    while not pending.done():
+                        await asyncio.wait([pending], timeout=PROGRESS_POLL_INTERVAL)
+                        if not pending.done():
+                            progress.done_bytes = await loop.run_in_executor(None, directory_size, extract_dir)
+                    progress.done_bytes = 0
+                
+                for result in await pending:
+                    member_done(result)
+            futures.pop(0)
+    
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory), start a fresh pool for later jobs
+        _discard_executor()
+        raise
+    
+    finally:
+        # Drop batches that have not started and wait for running ones so the
+        # caller can safely remove extract_dir
+        for future in futures:
+            future.cancel()
+        running = [asyncio.wrap_future(future) for future in futures if not future.cancelled()]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    
+    return results
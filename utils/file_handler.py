@@ -1,12 +1,11 @@
 import os
 import zipfile
-import rarfile
-import py7zr
-import tarfile
 import shutil
 import random
-from pathlib import Path
-from utils.helpers import get_file_extension, is_archive_file, progress_bar, format_size
+from utils.helpers import get_file_extension, is_archive_file
+from utils import extraction_engine
+from utils.disk_budget import disk_budget
+from utils.cancel_token import OperationCancelled
 
 
 async def download_file(client, message, progress_callback=None):
@@ -40,73 +39,65 @@ async def download_file(client, message, progress_callback=None):
     return file_path, file_size, file_name
 
 
-async def extract_archive(file_path, password=None):
+def make_extract_dir():
+    """
+    Create a fresh extraction directory with a short path
+    Returns: extract_dir path
+    """
+    # Use random ID instead of full filename to avoid Windows 260 char limit
+    random_id = random.randint(100000, 999999)
+    extract_dir = f"downloads/ext_{random_id}"
+    os.makedirs(extract_dir, exist_ok=True)
+    return extract_dir
+
+
+async def extract_archive(file_path, password=None, on_member=None, extract_dir=None, members=None, max_files=None, limits=None, cancel=None, progress=None):
     """
     Extract archive file to a shorter path to avoid Windows path limits
+    
+    Decompression runs in the shared process pool from utils.extraction_engine.
+    If on_member is given, it is called with each extracted file's result
+    (index, name, path, size), in archive order, as soon as that file has
+    been fully written, so callers can start uploading while the rest of the
+    archive is unpacked.
+    
+    The archive listing is read first and only the chosen members are
+    unpacked: the indexes in members (see list_archive) if given, otherwise
+    the first max_files files.
+    
+    limits are the user's tier limits from USER_LIMITS; extraction stops as
+    soon as the archive unpacks past them. cancel is the job's CancelToken,
+    workers check it between members and chunks. progress is an optional
+    extraction_engine.ExtractionProgress the extraction keeps up to date.
+    
     Returns: (success: bool, extracted_dir: str, error_msg: str)
     """
-    import asyncio
-    from concurrent.futures import ThreadPoolExecutor
-    
-    def _extract_sync(file_path, password, extract_dir, ext):
-        """Synchronous extraction logic to run in thread"""
-        # Extract based on file type
-        if ext == 'zip':
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                if password:
-                    zip_ref.setpassword(password.encode('utf-8'))
-                zip_ref.extractall(extract_dir)
-        
-        elif ext == 'rar':
-            with rarfile.RarFile(file_path, 'r') as rar_ref:
-                if password:
-                    rar_ref.setpassword(password)
-                rar_ref.extractall(extract_dir)
-        
-        elif ext == '7z':
-            # 7z requires password as string, not bytes
-            if password:
-                with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
-                    sz_ref.extractall(extract_dir)
-            else:
-                with py7zr.SevenZipFile(file_path, mode='r') as sz_ref:
-                    sz_ref.extractall(extract_dir)
-        
-        elif ext in ['tar', 'gz', 'bz2']:
-            with tarfile.open(file_path, 'r:*') as tar_ref:
-                tar_ref.extractall(extract_dir)
-        
-        else:
-            raise ValueError(f"Unsupported archive format: .{ext}")
-    
     try:
         file_name = os.path.basename(file_path)
         ext = get_file_extension(file_name)
         
         # Create extraction directory with VERY short path to avoid Windows 260 char limit
-        # Use random ID instead of full filename
-        random_id = random.randint(100000, 999999)
-        extract_dir = f"downloads/ext_{random_id}"
-        os.makedirs(extract_dir, exist_ok=True)
+        if extract_dir is None:
+            extract_dir = make_extract_dir()
         
-        # Run extraction in thread executor to avoid blocking
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            await loop.run_in_executor(
-                executor,
-                _extract_sync,
-                file_path,
-                password,
-                extract_dir,
-                ext
-            )
+        # Run extraction in the shared process pool to keep the event loop free
+        results = await extraction_engine.extract(
+            file_path, password, ext, extract_dir, on_member, indexes=members, max_members=max_files, limits=limits, cancel=cancel,
+            progress=progress
+        )
         
         # Check if extraction was successful
-        if not os.listdir(extract_dir):
+        if not results:
             return False, None, "Archive is empty or extraction failed"
         
         return True, extract_dir, None
     
+    except OperationCancelled:
+        return False, None, "⏸️ Process cancelled by user."
+    
+    except extraction_engine.ExtractionLimitError as e:
+        return False, None, f"🛑 {str(e)}."
+    
     except zipfile.BadZipFile:
         return False, None, "❌ File is corrupted or not a valid ZIP file"
     
@@ -124,7 +115,7 @@ async def extract_archive(file_path, password=None):
         return False, None, f"❌ Unsupported feature: {str(e)}"
     
     except ValueError as e:
-        # Unsupported format from _extract_sync
+        # Unsupported format from extraction_engine.extract_batch_sync/extract_whole_sync
         return False, None, str(e)
     
     except RuntimeError as e:
@@ -141,28 +132,22 @@ async def extract_archive(file_path, password=None):
         return False, None, f"❌ Error: {str(e)}"
 
 
-async def get_all_files(directory, max_files=50):
+async def list_archive(file_path, password=None):
     """
-    Get all files from directory recursively
-    Returns: list of file paths
+    Read an archive's member listing without extracting anything
+    Returns: list of dicts with index, name, size and compressed_size
     """
-    files = []
-    for root, dirs, filenames in os.walk(directory):
-        for filename in filenames:
-            file_path = os.path.join(root, filename)
-            files.append(file_path)
-            
-            if len(files) >= max_files:
-                break
-        
-        if len(files) >= max_files:
-            break
-    
-    return files
+    ext = get_file_extension(os.path.basename(file_path))
+    return await extraction_engine.list_members(file_path, password, ext)
 
 
-async def cleanup_files(paths):
-    """Delete files and directories instantly"""
+async def cleanup_files(paths, reservation_key=None):
+    """
+    Delete files and directories instantly
+    
+    If reservation_key is given, that job's disk reservation is released
+    once the files are gone.
+    """
     import asyncio
     
     async def cleanup_single(path):
@@ -178,6 +163,9 @@ async def cleanup_files(paths):
     # Run cleanup tasks concurrently
     tasks = [cleanup_single(path) for path in paths]
     await asyncio.gather(*tasks, return_exceptions=True)
+    
+    if reservation_key is not None:
+        disk_budget.release(reservation_key)
 
 
 async def validate_file_type(filename):
@@ -0,0 +1,85 @@
+import asyncio
+import heapq
+import itertools
+from config import MAX_CONCURRENT_DOWNLOADS
+
+
+# Lower value is admitted first
+TIER_PRIORITY = {
+    'ultra_premium': 0,
+    'premium': 1,
+    'free': 2
+}
+
+# How often a queued job re-checks its position (seconds)
+QUEUE_POLL_INTERVAL = 5
+
+
+class JobScheduler:
+    """
+    Global extraction job queue
+    
+    At most `max_concurrent` jobs run at once. Waiting jobs are admitted by
+    tier (ultra premium, then premium, then free) and first come, first
+    served within a tier.
+    """
+    
+    def __init__(self, max_concurrent=MAX_CONCURRENT_DOWNLOADS):
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.queue = []  # heap of (priority, sequence, user_id, future)
+        self._sequence = itertools.count()
+    
+    def position(self, entry):
+        """1-based position of a queued entry"""
+        return sum(1 for queued in self.queue if queued[:2] < entry[:2]) + 1
+    
+    def queued_users(self):
+        """User IDs waiting for a slot, in admission order"""
+        return [entry[2] for entry in sorted(self.queue)]
+    
+    async def acquire(self, user_id, tier, on_wait=None):
+        """
+        Wait for a job slot
+        
+        Args:
+            user_id (int): Telegram user ID
+            tier (str): User tier, decides the priority lane
+            on_wait: Optional async callable taking the queue position; it is
+                called every QUEUE_POLL_INTERVAL seconds while waiting and may
+                raise to give up the place in the queue
+        """
+        if self.active < self.max_concurrent and not self.queue:
+            self.active += 1
+            return
+        
+        future = asyncio.get_event_loop().create_future()
+        entry = (TIER_PRIORITY.get(tier, TIER_PRIORITY['free']), next(self._sequence), user_id, future)
+        heapq.heappush(self.queue, entry)
+        
+        try:
+            while not future.done():
+                if on_wait:
+                    await on_wait(self.position(entry))
+                await asyncio.wait({future}, timeout=QUEUE_POLL_INTERVAL)
+        except BaseException:
+            if future.done():
+                # A slot was handed over while we were giving up
+                self.release()
+            else:
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+            raise
+    
+    def release(self):
+        """Free a job slot, handing it to the next queued job if any"""
+        while self.queue:
+            entry = heapq.heappop(self.queue)
+            if not entry[3].done():
+                entry[3].set_result(True)
+                return
+        self.active -= 1
+
+
+# Shared by every extraction job
+job_scheduler = JobScheduler()
@@ -1,117 +1,162 @@
 from datetime import datetime, timedelta
-from database.database import users_collection, downloads_collection
+from pymongo import ReturnDocument
+from database.async_database import users, downloads
+from database.repository import get_user, increment_counters
 from config import USER_LIMITS
 
 
-def check_user_quota(user_id):
+async def check_quota(user_id, file_size):
     """
-    Check if user has remaining quota for the day
+    Check the daily limit and file size without taking from the quota
+    
+    Read only, for work done before a job reserves its file with
+    reserve_quota (e.g. the /list download).
     Returns: (can_proceed: bool, message: str, current_tier: str)
     """
-    user = users_collection.find_one({"id": user_id})
+    user = await get_user(user_id)
     
     if not user:
         # New user, should be registered first
         return False, "Please use /start first to register.", "free"
     
-    # Check if premium has expired
-    if user.get('tier') in ['premium', 'ultra_premium']:
-        if user.get('premium_expiry') and user['premium_expiry'] < datetime.utcnow():
-            users_collection.update_one(
-                {"id": user_id},
-                {"$set": {"tier": "free"}}
-            )
-            user['tier'] = 'free'
+    tier, daily_count = _effective_user(user, datetime.utcnow())
+    error = _quota_error(tier, daily_count, file_size)
+    if error:
+        return False, error, tier
     
-    # Reset daily count if needed
-    if user.get('last_reset', datetime.utcnow()) < datetime.utcnow() - timedelta(days=1):
-        users_collection.update_one(
-            {"id": user_id},
-            {"$set": {"daily_count": 0, "last_reset": datetime.utcnow()}}
-        )
-        user['daily_count'] = 0
+    return True, "OK", tier
+
+
+def _limit_expr(tier_expr, field):
+    """Aggregation expression picking a USER_LIMITS field for a tier"""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": [tier_expr, tier]}, "then": limits[field]}
+                for tier, limits in USER_LIMITS.items()
+            ],
+            "default": USER_LIMITS['free'][field]
+        }
+    }
+
+
+def _effective_user(user, now):
+    """Tier and daily count after the expiry downgrade and daily reset"""
+    tier = user.get('tier') or 'free'
+    if tier in ['premium', 'ultra_premium'] and user.get('premium_expiry') and user['premium_expiry'] < now:
+        tier = 'free'
     
-    # Get tier limits
-    tier_limits = USER_LIMITS.get(user.get('tier', 'free'), USER_LIMITS['free'])
-    daily_limit = tier_limits['daily_files']
+    daily_count = user.get('daily_count') or 0
+    if (user.get('last_reset') or now) < now - timedelta(days=1):
+        daily_count = 0
     
-    # Check if user has quota
-    if user.get('daily_count', 0) >= daily_limit:
-        return False, f"❌ Daily limit reached! You can extract {daily_limit} file(s) per day.\nUpgrade to premium for more quota: /premium", user.get('tier', 'free')
+    return tier, daily_count
+
+
+def _quota_error(tier, daily_count, file_size):
+    """Message explaining why a tier can't take the file, or None"""
+    tier_limits = USER_LIMITS.get(tier, USER_LIMITS['free'])
+    
+    if daily_count >= tier_limits['daily_files']:
+        return f"❌ Daily limit reached! You can extract {tier_limits['daily_files']} file(s) per day.\nUpgrade to premium for more quota: /premium"
+    
+    if file_size > tier_limits['max_size_bytes']:
+        from utils.helpers import format_size
+        return f"❌ File too large! Your tier allows max {format_size(tier_limits['max_size_bytes'])}\nFile size: {format_size(file_size)}\nUpgrade to premium: /premium"
     
-    return True, "OK", user.get('tier', 'free')
+    return None
 
 
-def check_file_size(user_id, file_size):
+async def reserve_quota(user_id, file_size):
     """
-    Check if file size is within user's tier limit
-    Returns: (can_proceed: bool, message: str)
+    Check and take one file from the user's daily quota in a single atomic update
+    
+    Applies the premium expiry downgrade and the daily reset, then checks
+    the daily limit and file size and increments the daily count only if
+    both pass. Two parallel jobs can't both take the last slot.
+    Returns: (can_proceed: bool, message: str, current_tier: str)
     """
-    user = users_collection.find_one({"id": user_id})
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=1)
+    
+    expired = {
+        "$and": [
+            {"$in": ["$tier", ['premium', 'ultra_premium']]},
+            {"$lt": [{"$ifNull": ["$premium_expiry", now]}, now]}
+        ]
+    }
+    needs_reset = {"$lt": [{"$ifNull": ["$last_reset", now]}, cutoff]}
+    fits = {
+        "$and": [
+            {"$lt": ["$daily_count", _limit_expr("$tier", 'daily_files')]},
+            {"$lte": [file_size, _limit_expr("$tier", 'max_size_bytes')]}
+        ]
+    }
     
-    if not user:
-        return False, "Please use /start first to register."
+    user = await users.find_one_and_update(
+        {"id": user_id},
+        [
+            {"$set": {
+                "tier": {"$cond": [expired, "free", {"$ifNull": ["$tier", "free"]}]},
+                "daily_count": {"$cond": [needs_reset, 0, {"$ifNull": ["$daily_count", 0]}]},
+                "last_reset": {"$cond": [needs_reset, now, "$last_reset"]}
+            }},
+            {"$set": {
+                "daily_count": {"$cond": [fits, {"$add": ["$daily_count", 1]}, "$daily_count"]}
+            }}
+        ],
+        projection={"tier": 1, "premium_expiry": 1, "daily_count": 1, "last_reset": 1},
+        return_document=ReturnDocument.BEFORE
+    )
     
-    # Get tier limits
-    tier_limits = USER_LIMITS.get(user.get('tier', 'free'), USER_LIMITS['free'])
-    max_size = tier_limits['max_size_bytes']
+    if not user:
+        # New user, should be registered first
+        return False, "Please use /start first to register.", "free"
     
-    if file_size > max_size:
-        from utils.helpers import format_size
-        return False, f"❌ File too large! Your tier allows max {format_size(max_size)}\nFile size: {format_size(file_size)}\nUpgrade to premium: /premium"
+    # Same decision the update made, from the document as it was before it
+    tier, daily_count = _effective_user(user, now)
+    error = _quota_error(tier, daily_count, file_size)
+    if error:
+        return False, error, tier
     
-    return True, "OK"
+    return True, "OK", tier
 
 
-def increment_user_quota(user_id, filename, file_size):
-    """Increment user's daily count and log download"""
-    # Increment daily count
-    users_collection.update_one(
-        {"id": user_id},
-        {"$inc": {"daily_count": 1}}
+async def release_quota(user_id):
+    """Give back a file reserved by reserve_quota when the job fails"""
+    await users.update_one(
+        {"id": user_id, "daily_count": {"$gt": 0}},
+        {"$inc": {"daily_count": -1}}
     )
-    
-    # Log download
-    downloads_collection.insert_one({
+
+
+async def log_download(user_id, filename, file_size):
+    """Record a finished download (the quota was taken by reserve_quota)"""
+    await downloads.insert_one({
         "user_id": user_id,
         "filename": filename,
         "size": file_size,
         "timestamp": datetime.utcnow()
     })
+    await increment_counters({"extractions": 1, "bytes_processed": file_size})
 
 
-def get_user_stats(user_id):
+async def get_user_stats(user_id):
     """
-    Get user statistics
+    Get user statistics (read only, like check_quota)
     Returns: dict with user info
     """
-    user = users_collection.find_one({"id": user_id})
+    user = await get_user(user_id)
     
     if not user:
         return None
     
-    # Check premium expiry
-    if user.get('tier') in ['premium', 'ultra_premium']:
-        if user.get('premium_expiry') and user['premium_expiry'] < datetime.utcnow():
-            users_collection.update_one(
-                {"id": user_id},
-                {"$set": {"tier": "free"}}
-            )
-            user['tier'] = 'free'
-    
-    # Reset daily count if needed
-    if user.get('last_reset', datetime.utcnow()) < datetime.utcnow() - timedelta(days=1):
-        users_collection.update_one(
-            {"id": user_id},
-            {"$set": {"daily_count": 0, "last_reset": datetime.utcnow()}}
-        )
-        user['daily_count'] = 0
-    
-    tier_limits = USER_LIMITS.get(user.get('tier', 'free'), USER_LIMITS['free'])
+    tier, daily_count = _effective_user(user, datetime.utcnow())
+    tier_limits = USER_LIMITS.get(tier, USER_LIMITS['free'])
     
     return {
-        'tier': user.get('tier', 'free'),
-        'daily_used': user.get('daily_count', 0),
+        'tier': tier,
+        'daily_used': daily_count,
         'daily_limit': tier_limits['daily_files'],
         'max_file_size': tier_limits['max_size_bytes'],
         'premium_expiry': user.get('premium_expiry'),
@@ -119,10 +164,20 @@ def get_user_stats(user_id):
     }
 
 
-def reset_all_quotas():
-    """Reset all users' daily quotas (for scheduled task)"""
-    result = users_collection.update_many(
-        {},
-        {"$set": {"daily_count": 0, "last_reset": datetime.utcnow()}}
+async def expire_premium_users():
+    """Downgrade every user whose premium has expired, returns how many"""
+    result = await users.update_many(
+        {"premium_expiry": {"$lt": datetime.utcnow()}, "tier": {"$in": ['premium', 'ultra_premium']}},
+        {"$set": {"tier": "free", "premium_expiry": None}}
+    )
+    return result.modified_count
+
+
+async def reset_stale_quotas():
+    """Reset the daily count of users last reset over a day ago, returns how many"""
+    now = datetime.utcnow()
+    result = await users.update_many(
+        {"last_reset": {"$lt": now - timedelta(days=1)}},
+        {"$set": {"daily_count": 0, "last_reset": now}}
     )
-    print(f"✅ Reset quotas for {result.modified_count} users")
+    return result.modified_count
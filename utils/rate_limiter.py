@@ -0,0 +1,38 @@
+import time
+from collections import deque
+from utils.cache import TTLCache, MISSING
+
+
+class RateLimiter:
+    """
+    Sliding-window limit of `max_attempts` per `window` seconds, per key
+    
+    Keys that stay idle for a whole window are forgotten.
+    """
+    
+    def __init__(self, max_attempts, window, maxsize=10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.attempts = TTLCache(maxsize, window)  # key -> deque of attempt times
+    
+    def hit(self, key):
+        """
+        Record an attempt
+        
+        Returns: seconds to wait before the next attempt is allowed, 0 if
+        this one is allowed (only allowed attempts are recorded)
+        """
+        now = time.monotonic()
+        attempts = self.attempts.peek(key)
+        if attempts is MISSING:
+            attempts = deque()
+        
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        
+        if len(attempts) >= self.max_attempts:
+            return attempts[0] + self.window - now
+        
+        attempts.append(now)
+        self.attempts.set(key, attempts)
+        return 0
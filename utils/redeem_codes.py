@@ -0,0 +1,69 @@
+import secrets
+import string
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+from database.async_database import redeem_codes
+
+
+# 32^10 possible codes, so collisions stay rare however many are issued.
+# Look-alike characters (0/O, 1/I) are left out.
+CODE_ALPHABET = ''.join(c for c in string.ascii_uppercase + string.digits if c not in '01OI')
+CODE_LENGTH = 10
+
+# Most codes one /generate may create
+MAX_CODES_PER_BATCH = 5000
+
+# Rounds of re-drawing codes that hit an existing one
+MAX_INSERT_ROUNDS = 5
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def generate_code(length=CODE_LENGTH):
+    """Random redeem code from a cryptographically secure source"""
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+async def create_codes(plan_type, duration_days, count):
+    """
+    Create `count` unused codes for a plan with unordered insert_many calls
+    
+    Codes that collide with existing ones are rejected by the unique
+    `code` index; only those are drawn again. Any other write error is
+    raised.
+    Returns: list of the created codes
+    """
+    created = []
+    missing = count
+    
+    for _ in range(MAX_INSERT_ROUNDS):
+        candidates = set()
+        while len(candidates) < missing:
+            candidates.add(generate_code())
+        
+        now = datetime.utcnow()
+        documents = [{
+            "code": code,
+            "plan_type": plan_type,
+            "duration_days": duration_days,
+            "is_used": False,
+            "used_by": None,
+            "created_date": now,
+            "used_date": None
+        } for code in candidates]
+        
+        try:
+            await redeem_codes.insert_many(documents, ordered=False)
+            failed = set()
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            failed = {error['index'] for error in errors}
+        
+        created.extend(document['code'] for index, document in enumerate(documents) if index not in failed)
+        missing = count - len(created)
+        if not missing:
+            break
+    
+    return created
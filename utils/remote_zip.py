@@ -0,0 +1,192 @@
+import os
+import struct
+import random
+import zipfile
+
+
+# Pyrogram's stream_media works in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+# End of central directory record, its ZIP64 locator and the ZIP64 record
+EOCD_SIGNATURE = b'PK\x05\x06'
+EOCD_SIZE = 22
+EOCD_MAX_COMMENT = 65535
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_LOCATOR_SIZE = 20
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+ZIP64_EOCD_SIZE = 56
+
+
+class RemoteZip:
+    """
+    A ZIP archive on Telegram, downloaded only where it is read
+    
+    The local file has the archive's full size but starts out sparse; only
+    the 1 MiB chunks holding the central directory and the members that
+    are extracted get downloaded and written at their offsets. zipfile can
+    then list and extract those members from it as usual.
+    """
+    
+    def __init__(self, client, message, file_path):
+        self.client = client
+        self.message = message
+        self.file_path = file_path
+        self.file_size = message.document.file_size
+        self.fetched = set()  # chunk indexes already written
+        self.cd_offset = None
+    
+    @classmethod
+    async def open(cls, client, message):
+        """Create the sparse local file and fetch the central directory"""
+        os.makedirs('downloads', exist_ok=True)
+        file_name = message.document.file_name or 'archive.zip'
+        file_path = f"downloads/{message.chat.id}_{random.randint(10000, 99999)}_{file_name}"
+        
+        remote = cls(client, message, file_path)
+        with open(file_path, 'wb') as f:
+            f.truncate(remote.file_size)
+        
+        try:
+            await remote.fetch_central_directory()
+        except Exception:
+            os.remove(file_path)
+            raise
+        return remote
+    
+    def read(self, offset, size):
+        """Read bytes of the local copy (only meaningful for fetched ranges)"""
+        with open(self.file_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+    
+    async def fetch(self, start, end, progress=None):
+        """
+        Make sure bytes [start, end) are downloaded
+        
+        Args:
+            progress: Optional async callable (current, total) in bytes of
+                this call's downloads
+        """
+        start = max(0, start)
+        end = min(self.file_size, end)
+        if end <= start:
+            return
+        
+        needed = [
+            index for index in range(start // CHUNK_SIZE, (end - 1) // CHUNK_SIZE + 1)
+            if index not in self.fetched
+        ]
+        await self._fetch_chunks(needed, progress)
+    
+    async def _fetch_chunks(self, needed, progress=None):
+        """Download chunk indexes, one stream_media call per consecutive run"""
+        done = 0
+        total = len(needed) * CHUNK_SIZE
+        
+        runs = []
+        for index in needed:
+            if runs and runs[-1][1] == index:
+                runs[-1][1] = index + 1
+            else:
+                runs.append([index, index + 1])
+        
+        with open(self.file_path, 'r+b') as f:
+            for first, last in runs:
+                index = first
+                async for chunk in self.client.stream_media(self.message, offset=first, limit=last - first):
+                    f.seek(index * CHUNK_SIZE)
+                    f.write(chunk)
+                    self.fetched.add(index)
+                    index += 1
+                    done += len(chunk)
+                    if progress:
+                        await progress(min(done, total), total)
+                
+                if index < last:
+                    raise IOError("Telegram returned fewer chunks than requested")
+    
+    async def fetch_central_directory(self):
+        """Locate the central directory from the archive tail and download it"""
+        tail_size = min(self.file_size, EOCD_SIZE + EOCD_MAX_COMMENT)
+        await self.fetch(self.file_size - tail_size, self.file_size)
+        tail = self.read(self.file_size - tail_size, tail_size)
+        
+        position = tail.rfind(EOCD_SIGNATURE)
+        if position < 0 or len(tail) - position < EOCD_SIZE:
+            raise zipfile.BadZipFile("End of central directory not found")
+        eocd_offset = self.file_size - tail_size + position
+        
+        cd_size, cd_offset = struct.unpack('<II', tail[position + 12:position + 20])
+        
+        if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+            # ZIP64: the real values are in the ZIP64 end of central directory record
+            locator_offset = eocd_offset - ZIP64_LOCATOR_SIZE
+            await self.fetch(locator_offset, eocd_offset)
+            locator = self.read(locator_offset, ZIP64_LOCATOR_SIZE)
+            if locator[:4] != ZIP64_LOCATOR_SIGNATURE:
+                raise zipfile.BadZipFile("ZIP64 locator not found")
+            zip64_offset = struct.unpack('<Q', locator[8:16])[0]
+            
+            await self.fetch(zip64_offset, zip64_offset + ZIP64_EOCD_SIZE)
+            record = self.read(zip64_offset, ZIP64_EOCD_SIZE)
+            if record[:4] != ZIP64_EOCD_SIGNATURE:
+                raise zipfile.BadZipFile("ZIP64 end of central directory not found")
+            cd_size, cd_offset = struct.unpack('<QQ', record[40:56])
+        
+        await self.fetch(cd_offset, cd_offset + cd_size)
+        self.cd_offset = cd_offset
+    
+    async def fetch_members(self, indexes, progress=None):
+        """
+        Download the local headers and data of the given members
+        
+        A member's data ends where the next member (or the central
+        directory) starts, so each one is a single byte range.
+        """
+        with zipfile.ZipFile(self.file_path, 'r') as archive:
+            infos = archive.infolist()
+        
+        boundaries = sorted(set(info.header_offset for info in infos) | {self.cd_offset})
+        
+        needed = set()
+        for index in indexes:
+            start = infos[index].header_offset
+            end = next(offset for offset in boundaries if offset > start)
+            needed.update(
+                chunk for chunk in range(start // CHUNK_SIZE, (end - 1) // CHUNK_SIZE + 1)
+                if chunk not in self.fetched
+            )
+        
+        await self._fetch_chunks(sorted(needed), progress)
+    
+    def fetched_bytes(self):
+        """Bytes downloaded so far"""
+        return len(self.fetched) * CHUNK_SIZE
+
+
+async def download_zip_members(client, message, indexes=None, max_members=None, progress=None):
+    """
+    Download only the parts of a ZIP document needed to extract some members
+    
+    Selects members like extraction_engine.select_members (indexes, or the
+    first max_members files) and fetches the central directory plus their
+    byte ranges. Raises if the document can't be read this way, callers
+    then fall back to a full download.
+    Returns: path of the local (partially sparse) copy
+    """
+    from utils.extraction_engine import select_members
+    
+    remote = await RemoteZip.open(client, message)
+    try:
+        with zipfile.ZipFile(remote.file_path, 'r') as archive:
+            members = [
+                {'index': index, 'name': info.filename, 'size': info.file_size}
+                for index, info in enumerate(archive.infolist())
+                if not info.is_dir()
+            ]
+        selected = select_members(members, indexes, max_members)
+        await remote.fetch_members([member['index'] for member in selected], progress)
+    except BaseException:
+        os.remove(remote.file_path)
+        raise
+    return remote.file_path
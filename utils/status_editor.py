@@ -0,0 +1,100 @@
+import time
+import asyncio
+from pyrogram.errors import FloodWait, MessageNotModified
+from config import STATUS_EDIT_INTERVAL
+from utils.cache import TTLCache, MISSING
+
+
+# Earliest time (monotonic) the next edit may be sent, by chat. Entries
+# expire once that time has passed, so idle chats cost nothing.
+chat_next_edit = TTLCache(maxsize=10000, ttl=STATUS_EDIT_INTERVAL)
+
+# Chats under FloodWait, expiring with the wait
+chat_flood_wait = TTLCache(maxsize=10000, ttl=STATUS_EDIT_INTERVAL)
+
+
+class StatusEditor:
+    """
+    Edits the status message of one job
+    
+    Progress updates are merged: only the latest text is kept and it is
+    sent once the chat may be edited again, at most one edit per
+    STATUS_EDIT_INTERVAL per chat across all jobs. Unchanged texts are not
+    sent, and while a chat is under FloodWait nothing is sent to it; the
+    latest text goes out when the wait is over.
+    """
+    
+    def __init__(self, message, interval=STATUS_EDIT_INTERVAL):
+        self.message = message
+        self.chat_id = message.chat.id
+        self.interval = interval
+        self.sent_text = None
+        self.pending = None  # (text, kwargs) waiting to be sent
+        self.flush_task = None
+    
+    def _wait_time(self):
+        """Seconds until this chat may be edited again"""
+        next_edit = chat_next_edit.peek(self.chat_id)
+        if next_edit is MISSING:
+            return 0
+        return max(0, next_edit - time.monotonic())
+    
+    def _hold_chat(self, seconds):
+        chat_next_edit.set(self.chat_id, time.monotonic() + seconds, ttl=seconds)
+    
+    def ready(self):
+        """Whether a progress update would be sent right away; lets callers skip building it"""
+        return self._wait_time() == 0 and (self.flush_task is None or self.flush_task.done())
+    
+    def update(self, text, **kwargs):
+        """Queue a progress edit, replacing any queued one"""
+        self.pending = (text, kwargs)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush())
+    
+    async def set(self, text, **kwargs):
+        """
+        Edit right away, for results and other texts the user must see
+        
+        Drops queued progress and ignores the edit interval. Under FloodWait
+        the text is queued instead and sent when the wait is over.
+        """
+        if self.flush_task and not self.flush_task.done():
+            self.flush_task.cancel()
+        self.flush_task = None
+        self.pending = None
+        await self._send(text, kwargs)
+    
+    async def _flush(self):
+        """Send the queued text as soon as the chat may be edited"""
+        while self.pending is not None:
+            wait = self._wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            text, kwargs = self.pending
+            self.pending = None
+            await self._send(text, kwargs)
+    
+    async def _send(self, text, kwargs):
+        if text == self.sent_text and not kwargs:
+            return
+        
+        if chat_flood_wait.peek(self.chat_id) is not MISSING:
+            # Don't spend a request on it
+            self.update(text, **kwargs)
+            return
+        
+        self._hold_chat(self.interval)
+        try:
+            await self.message.edit_text(text, **kwargs)
+            self.sent_text = text
+        except MessageNotModified:
+            self.sent_text = text
+        except FloodWait as e:
+            self._hold_chat(e.value)
+            chat_flood_wait.set(self.chat_id, True, ttl=e.value)
+            if self.pending is None:
+                self.update(text, **kwargs)
+        except Exception:
+            pass
@@ -0,0 +1,26 @@
+import asyncio
+from config import SWEEP_INTERVAL
+from utils.quota_manager import expire_premium_users, reset_stale_quotas
+
+
+async def run_sweeps():
+    """Apply premium expiry and daily resets to every user that is due"""
+    expired = await expire_premium_users()
+    reset = await reset_stale_quotas()
+    if expired or reset:
+        print(f"Sweep: {expired} premium plan(s) expired, {reset} daily quota(s) reset")
+
+
+async def sweeper_loop(interval=SWEEP_INTERVAL):
+    """Run the sweeps every `interval` seconds, for the bot's lifetime"""
+    while True:
+        try:
+            await run_sweeps()
+        except Exception as e:
+            print(f"Error during sweep: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_sweeper():
+    """Start the sweeper in the background, returns its task"""
+    return asyncio.create_task(sweeper_loop())
@@ -0,0 +1,138 @@
+import os
+import io
+import asyncio
+import hashlib
+from collections import OrderedDict
+from PIL import Image
+from config import THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_BYTES
+
+
+# Telegram's limits for custom thumbnails
+THUMBNAIL_MAX_SIDE = 320
+THUMBNAIL_MAX_BYTES = 200 * 1024
+
+# JPEG qualities tried in turn until the thumbnail is small enough
+JPEG_QUALITIES = (90, 80, 70, 60, 50, 40)
+
+
+def normalize_thumbnail(data, path):
+    """
+    Convert an image to a Telegram thumbnail JPEG at path (blocking)
+    
+    Scaled to fit THUMBNAIL_MAX_SIDE and re-encoded at falling qualities
+    until it is under THUMBNAIL_MAX_BYTES.
+    Returns: size of the written file
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGB')
+        image.thumbnail((THUMBNAIL_MAX_SIDE, THUMBNAIL_MAX_SIDE))
+        
+        for quality in JPEG_QUALITIES:
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True)
+            if output.tell() <= THUMBNAIL_MAX_BYTES:
+                break
+    
+    # Write under a temporary name so readers never see half a file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(output.getvalue())
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+class ThumbnailCache:
+    """
+    Custom thumbnails, downloaded and normalized once per file_unique_id
+    
+    Shared by every upload of every job. Files live in THUMBNAIL_CACHE_DIR
+    and survive restarts; the least recently used are deleted once the
+    directory grows past THUMBNAIL_CACHE_BYTES.
+    """
+    
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = None  # key -> file size, least recently used first
+        self.loading = {}  # key -> Future of a running download
+    
+    def _load(self):
+        """Index thumbnails left by earlier runs, oldest use first"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.jpg') and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        self.entries = OrderedDict((key, size) for _, key, size in sorted(files))
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+    
+    def _evict(self, keep):
+        """Delete least recently used thumbnails until the cache fits"""
+        while sum(self.entries.values()) > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            if key == keep:
+                self.entries.move_to_end(key)
+                continue
+            del self.entries[key]
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+    
+    async def get(self, client, settings):
+        """
+        Local path of a user's custom thumbnail, or None
+        
+        Downloads it on first use. Returns None if the user has none or
+        it can't be downloaded or read, uploads then go without one.
+        """
+        file_id = settings.get('thumbnail')
+        if not file_id:
+            return None
+        
+        if self.entries is None:
+            self._load()
+        
+        # Thumbnails saved before file_unique_id was stored are keyed by file_id
+        unique_id = settings.get('thumbnail_unique_id') or file_id
+        key = hashlib.sha1(unique_id.encode('utf-8')).hexdigest()[:20]
+        path = self._path(key)
+        
+        if key in self.entries and os.path.isfile(path):
+            self.entries.move_to_end(key)
+            try:
+                os.utime(path)  # Remember the use across restarts
+            except OSError:
+                pass
+            return path
+        
+        # Concurrent jobs of the same user share one download
+        future = self.loading.get(key)
+        if future is None:
+            future = self.loading[key] = asyncio.ensure_future(self._fetch(client, file_id, key))
+        return await asyncio.shield(future)
+    
+    async def _fetch(self, client, file_id, key):
+        """Download, normalize and store one thumbnail"""
+        try:
+            data = await client.download_media(file_id, in_memory=True)
+            loop = asyncio.get_event_loop()
+            size = await loop.run_in_executor(None, normalize_thumbnail, bytes(data.getbuffer()), self._path(key))
+        except Exception as e:
+            print(f"Error caching thumbnail: {e}")
+            return None
+        finally:
+            del self.loading[key]
+        
+        self.entries[key] = size
+        self.entries.move_to_end(key)
+        self._evict(keep=key)
+        return self._path(key)
+
+
+# Shared by every job
+thumbnail_cache = ThumbnailCache()
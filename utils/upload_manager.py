@@ -0,0 +1,76 @@
+import asyncio
+from config import MAX_CONCURRENT_UPLOADS, MAX_TOTAL_UPLOADS
+
+
+# Shared by every job and sized to Pyrogram's max_concurrent_transmissions,
+# so an upload that is waiting for its turn never starves the one it waits on
+global_upload_slots = asyncio.Semaphore(MAX_TOTAL_UPLOADS)
+
+
+class OrderedUploader:
+    """
+    Per-job upload pool
+    
+    Up to `concurrency` files are uploaded at once, but every message is
+    sent only after the previous one, so files still arrive in archive order.
+    Each upload receives a `wait_turn` progress callback to pass to Pyrogram;
+    it holds the final "upload finished" step until the preceding file has
+    been delivered.
+    """
+    
+    def __init__(self, concurrency=MAX_CONCURRENT_UPLOADS):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.entries = []
+    
+    def submit(self, upload):
+        """
+        Queue an upload
+        
+        Args:
+            upload: async callable taking the `wait_turn` progress callback
+        
+        Returns:
+            asyncio.Task: Task resolving to the upload's return value
+        """
+        previous = self.entries[-1] if self.entries else None
+        started = asyncio.Event()
+        sent = asyncio.Event()
+        task = asyncio.create_task(self._run(upload, previous, started, sent))
+        self.entries.append((task, started, sent))
+        return task
+    
+    async def _run(self, upload, previous, started, sent):
+        """Run one upload once it is its turn to take a slot"""
+        prev_started = previous[1] if previous else None
+        prev_sent = previous[2] if previous else None
+        
+        async def wait_turn(current, total):
+            if current >= total and prev_sent:
+                await prev_sent.wait()
+        
+        try:
+            # Take slots in submission order so a waiting upload never holds
+            # a slot its predecessor still needs
+            if prev_started:
+                await prev_started.wait()
+            async with self.slots, global_upload_slots:
+                started.set()
+                return await upload(wait_turn)
+        finally:
+            started.set()
+            if prev_sent:
+                await prev_sent.wait()
+            sent.set()
+    
+    async def join(self):
+        """Wait for every submitted upload, returns their results in order"""
+        return await asyncio.gather(*(task for task, _, _ in self.entries), return_exceptions=True)
+    
+    async def cancel(self):
+        """Cancel pending and running uploads"""
+        for task, started, sent in self.entries:
+            # Release successors of uploads that never got to run
+            started.set()
+            sent.set()
+            task.cancel()
+        await asyncio.gather(*(task for task, _, _ in self.entries), return_exceptions=True)
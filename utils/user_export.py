@@ -0,0 +1,107 @@
+import csv
+import gzip
+from datetime import datetime, timedelta
+from database.database import users_collection
+
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+# Export columns in output order: key -> (header, user field, default, formatter)
+EXPORT_COLUMNS = {
+    'id': ('User ID', 'id', '', None),
+    'username': ('Username', 'username', '', None),
+    'first_name': ('First Name', 'first_name', '', None),
+    'join_date': ('Join Date', 'join_date', None, _format_datetime),
+    'tier': ('Tier', 'tier', 'free', None),
+    'premium_expiry': ('Premium Expiry', 'premium_expiry', None, _format_datetime),
+    'daily_count': ('Daily Count', 'daily_count', 0, None),
+    'is_banned': ('Is Banned', 'is_banned', False, None)
+}
+
+# Documents fetched from the server per cursor batch
+EXPORT_BATCH_SIZE = 1000
+
+
+def parse_export_args(args):
+    """
+    Parse /exportusers options
+    
+    Accepts `columns=id,username,...`, `since=YYYY-MM-DD`,
+    `until=YYYY-MM-DD` (both on join date, until inclusive) and `gzip`.
+    Returns: (columns, since, until, compress)
+    Raises: ValueError with a user-facing message
+    """
+    columns = list(EXPORT_COLUMNS)
+    since = None
+    until = None
+    compress = False
+    
+    for arg in args:
+        key, _, value = arg.partition('=')
+        key = key.lower()
+        
+        if key == 'gzip' and not value:
+            compress = True
+        elif key == 'columns' and value:
+            columns = [column.strip().lower() for column in value.split(',') if column.strip()]
+            unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+            if unknown or not columns:
+                raise ValueError(f"Unknown column(s): {', '.join(unknown) or '(none)'}")
+        elif key in ('since', 'until') and value:
+            try:
+                date = datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Invalid date `{value}`, use YYYY-MM-DD")
+            if key == 'since':
+                since = date
+            else:
+                until = date + timedelta(days=1)
+        else:
+            raise ValueError(f"Unknown option `{arg}`")
+    
+    return columns, since, until, compress
+
+
+def write_users_csv(path, columns, since=None, until=None, compress=False):
+    """
+    Stream users into a CSV file (gzip compressed if requested)
+    
+    Only the exported fields are fetched and rows are written as the cursor
+    yields them, so memory use doesn't grow with the number of users.
+    Blocking, run it in the database executor.
+    Returns: number of users written
+    """
+    query = {}
+    if since or until:
+        query['join_date'] = {}
+        if since:
+            query['join_date']['$gte'] = since
+        if until:
+            query['join_date']['$lt'] = until
+    
+    fields = [EXPORT_COLUMNS[column] for column in columns]
+    projection = {field: 1 for _, field, _, _ in fields}
+    projection['_id'] = 0
+    
+    opener = gzip.open if compress else open
+    count = 0
+    
+    with opener(path, 'wt', newline='', encoding='utf-8') as output:
+        writer = csv.writer(output)
+        writer.writerow([header for header, _, _, _ in fields])
+        
+        cursor = users_collection.find(query, projection, batch_size=EXPORT_BATCH_SIZE)
+        try:
+            for user in cursor:
+                row = []
+                for _, field, default, formatter in fields:
+                    value = user.get(field, default)
+                    row.append(formatter(value) if formatter else value)
+                writer.writerow(row)
+                count += 1
+        finally:
+            cursor.close()
+    
+    return count